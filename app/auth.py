@@ -1,42 +1,217 @@
 """
 認證和 JWT 處理模組
 """
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
-from jose import JWTError, jwt
+from typing import Optional, Dict, Any, Tuple
+import jwt
+import orjson
 from argon2 import PasswordHasher
 from argon2.exceptions import VerifyMismatchError, HashingError
-from fastapi import HTTPException, status, Depends
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.hmac import HMAC
+from fastapi import HTTPException, status, Depends, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.security import HTTPBearer
+import asyncio
+import base64
+import binascii
 import hashlib
+import hmac
+import logging
+import os
 import secrets
+import time
 
 from app.config import settings
 from app.database import UserRepository, RefreshTokenRepository
 from app.models import TokenData
+from app.utils import ACCESS_TOKEN_EXPIRES_IN, TTLCache, get_utc_now
+
+logger = logging.getLogger(__name__)
 
 
 # Argon2id 密碼雜湊器 - 使用推薦的安全參數
 password_hasher = PasswordHasher(
     time_cost=3,        # 3 次迭代
     memory_cost=65536,  # 64 MB (64 * 1024 KB)
-    parallelism=1,      # 1 個線程
+    parallelism=4,      # 4 條通道並行填充記憶體，降低單次雜湊的延遲（固定值，避免不同主機間反覆重新雜湊）
     hash_len=32,        # 32 字節輸出
     salt_len=16         # 16 字節鹽值
 )
 
+# 密碼雜湊專用執行緒池 - Argon2 會佔用數十毫秒 CPU，移出事件迴圈以免阻塞其他請求
+_password_executor = ThreadPoolExecutor(
+    max_workers=os.cpu_count() or 1,
+    thread_name_prefix="argon2"
+)
+
 # HTTP Bearer Token 認證
 security = HTTPBearer()
 
 
+class _BearerToken(HTTPBearer):
+    """
+    輕量的 Bearer Token 解析依賴
+    
+    直接從 Authorization 標頭取出 Token 字串，不建立 HTTPAuthorizationCredentials 物件；
+    繼承 HTTPBearer 以保留 OpenAPI 文件中的安全性定義。缺少或格式錯誤時回傳 401
+    """
+    
+    async def __call__(self, request: Request) -> str:
+        authorization = request.headers.get("authorization")
+        if authorization and authorization[:7].lower() == "bearer " and len(authorization) > 7:
+            return authorization[7:]
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+bearer_token = _BearerToken(scheme_name="HTTPBearer")
+
+# Token 相關設定 - 於載入時讀取一次，避免每次簽發與驗證都存取 settings 並重新建立 timedelta
+_SECRET_KEY = settings.SECRET_KEY
+_ALGORITHM = settings.ALGORITHM
+_ALGORITHMS = [_ALGORITHM]
+_REFRESH_TOKEN_EXPIRE = timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+
+# JWT 簽發所需的固定資料 - 於載入時預先計算，避免每次簽發都重新解析演算法、建立金鑰與序列化標頭
+_HMAC_DIGESTS = {"HS256": hashes.SHA256, "HS384": hashes.SHA384, "HS512": hashes.SHA512}
+_HMAC_DIGEST = _HMAC_DIGESTS.get(_ALGORITHM)
+_SIGNING_KEY = _SECRET_KEY.encode()
+# 已載入金鑰的 HMAC 範本 - 每次簽章 copy() 後再 update，省去重新計算金鑰的 ipad/opad 區塊；
+# 使用 cryptography（OpenSSL EVP_MAC）的 HMAC，copy/update/finalize 的呼叫開銷低於標準函式庫 hmac
+_HMAC_TEMPLATE = HMAC(_SIGNING_KEY, _HMAC_DIGEST()) if _HMAC_DIGEST is not None else None
+
+
+def _hmac_sign(signing_input: bytes) -> bytes:
+    """以預先載入金鑰的 HMAC 範本計算簽章"""
+    mac = _HMAC_TEMPLATE.copy()
+    mac.update(signing_input)
+    return mac.finalize()
+
+
+def _b64url(data: bytes) -> bytes:
+    """Base64URL 編碼（去除結尾的 = 填充）"""
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+def _b64url_decode(data: bytes) -> bytes:
+    """Base64URL 解碼（補回結尾的 = 填充）"""
+    return base64.urlsafe_b64decode(data + b"=" * (-len(data) % 4))
+
+
+_JWT_HEADER_B64 = _b64url(orjson.dumps({"alg": _ALGORITHM, "typ": "JWT"}))
+
+# 重新整理 Token 摘要長度 - Token 為 256 位元隨機值，截斷為 128 位元的 SHA-256 摘要仍足以避免碰撞，
+# 並使 token_hash 欄位與索引縮小一半
+TOKEN_HASH_BYTES = 16
+
+
+def _refresh_token_digest(raw: bytes) -> bytes:
+    """
+    計算重新整理 Token 原始位元組的摘要
+    
+    使用 OpenSSL 實作的 SHA-256（支援 SHA-NI 的 CPU 上以硬體指令計算），截斷為 TOKEN_HASH_BYTES 位元組
+    """
+    return hashlib.sha256(raw).digest()[:TOKEN_HASH_BYTES]
+
+
+def _encode_jwt(payload: Dict[str, Any]) -> str:
+    """
+    以 HMAC 簽發 JWT
+    
+    使用預先計算的標頭與金鑰、orjson 序列化 payload，並直接以 hmac 計算簽章；
+    非 HMAC 演算法則交由 PyJWT 處理
+    """
+    if _HMAC_DIGEST is None:
+        return jwt.encode(payload, _SECRET_KEY, algorithm=_ALGORITHM)
+    signing_input = _JWT_HEADER_B64 + b"." + _b64url(orjson.dumps(payload))
+    signature = _hmac_sign(signing_input)
+    return (signing_input + b"." + _b64url(signature)).decode()
+
+
+# 存取 Token 必須包含的 claim
+_REQUIRED_CLAIMS = ("exp", "sub", "type")
+
+# Token 長度限制 - 超出範圍的輸入直接拒絕，避免對超大的偽造 Token 進行雜湊、簽章驗證或資料庫查詢
+_MIN_TOKEN_LENGTH = 20
+_MAX_TOKEN_LENGTH = 4096
+
+
+def _decode_jwt(token: str) -> Dict[str, Any]:
+    """
+    驗證並解碼以 HMAC 簽發的 JWT
+    
+    以 hmac.compare_digest 比對簽章、orjson 解析標頭與 payload，並檢查必要 claim 與過期時間；
+    非 HMAC 演算法則交由 PyJWT 處理。驗證失敗時拋出 PyJWT 對應的例外
+    """
+    if _HMAC_DIGEST is None:
+        return jwt.decode(
+            token, _SECRET_KEY, algorithms=_ALGORITHMS,
+            options={"require": list(_REQUIRED_CLAIMS)}
+        )
+    
+    try:
+        signing_input, _, signature_b64 = token.encode("ascii").rpartition(b".")
+        header_b64, _, payload_b64 = signing_input.partition(b".")
+        if not header_b64 or not payload_b64 or b"." in payload_b64:
+            raise jwt.DecodeError("Not enough segments")
+        signature = _b64url_decode(signature_b64)
+    except (UnicodeEncodeError, ValueError) as e:
+        raise jwt.DecodeError("Invalid token encoding") from e
+    
+    expected = _hmac_sign(signing_input)
+    if not hmac.compare_digest(signature, expected):
+        raise jwt.InvalidSignatureError("Signature verification failed")
+    
+    try:
+        # 本服務簽發的標頭固定不變，相同時略過解析
+        if header_b64 != _JWT_HEADER_B64:
+            header = orjson.loads(_b64url_decode(header_b64))
+            if not isinstance(header, dict) or header.get("alg") != _ALGORITHM:
+                raise jwt.InvalidAlgorithmError("The specified alg value is not allowed")
+        payload = orjson.loads(_b64url_decode(payload_b64))
+    except ValueError as e:
+        raise jwt.DecodeError("Invalid token payload") from e
+    if not isinstance(payload, dict):
+        raise jwt.DecodeError("Invalid payload string: must be a json object")
+    
+    for claim in _REQUIRED_CLAIMS:
+        if claim not in payload:
+            raise jwt.MissingRequiredClaimError(claim)
+    exp = payload["exp"]
+    if isinstance(exp, bool) or not isinstance(exp, (int, float)):
+        raise jwt.DecodeError("Expiration Time claim (exp) must be an integer.")
+    if exp <= time.time():
+        raise jwt.ExpiredSignatureError("Signature has expired")
+    return payload
+
+
+# 已驗證存取 Token 快取 - 以 Token 的 SHA-256 摘要為鍵，避免重複進行 JWT 解碼與簽章驗證
+_verified_cache = TTLCache(
+    maxsize=settings.TOKEN_CACHE_MAX_SIZE,
+    ttl=settings.TOKEN_CACHE_TTL_SECONDS
+)
+
+
+# 進行中的 refresh token 輪替 - 以 Token 摘要為鍵，同一 Token 的並行請求共用同一次輪替結果
+_refresh_inflight: Dict[bytes, "asyncio.Future[Optional[Dict[str, str]]]"] = {}
+
+
 class AuthService:
     """認證服務類別"""
     
     @staticmethod
-    def verify_password(plain_password: str, hashed_password: str) -> bool:
-        """驗證密碼"""
+    async def verify_password(plain_password: str, hashed_password: str) -> bool:
+        """驗證密碼（於密碼雜湊執行緒池中執行）"""
+        loop = asyncio.get_running_loop()
         try:
-            password_hasher.verify(hashed_password, plain_password)
+            await loop.run_in_executor(
+                _password_executor, password_hasher.verify, hashed_password, plain_password
+            )
             return True
         except VerifyMismatchError:
             return False
@@ -44,10 +219,11 @@ class AuthService:
             return False
     
     @staticmethod
-    def get_password_hash(password: str) -> str:
-        """取得密碼雜湊值"""
+    async def get_password_hash(password: str) -> str:
+        """取得密碼雜湊值（於密碼雜湊執行緒池中執行）"""
+        loop = asyncio.get_running_loop()
         try:
-            return password_hasher.hash(password)
+            return await loop.run_in_executor(_password_executor, password_hasher.hash, password)
         except HashingError as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -57,85 +233,181 @@ class AuthService:
     @staticmethod
     def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
         """建立存取 Token"""
-        from app.utils import get_utc_now
-        
         to_encode = data.copy()
+        # exp 以 NumericDate（秒數整數）表示，直接由 time.time() 計算，不建立 datetime 物件
         if expires_delta:
-            expire = get_utc_now() + expires_delta
+            expire = int(time.time() + expires_delta.total_seconds())
         else:
-            expire = get_utc_now() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+            expire = int(time.time()) + ACCESS_TOKEN_EXPIRES_IN
         
         # 確保 sub (subject) 欄位是字符串類型，符合 JWT 標準
         if "sub" in to_encode and not isinstance(to_encode["sub"], str):
             to_encode["sub"] = str(to_encode["sub"])
         
         to_encode.update({"exp": expire, "type": "access"})
-        encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
-        return encoded_jwt
+        return _encode_jwt(to_encode)
     
     @staticmethod
-    def create_refresh_token(user_id: int) -> str:
-        """建立重新整理 Token"""
-        from app.utils import get_utc_now
+    def hash_refresh_token(token: str) -> Optional[bytes]:
+        """
+        計算重新整理 Token 的摘要（截斷為 TOKEN_HASH_BYTES 位元組的 SHA-256，對應 BINARY(16) 欄位）
+        
+        Token 為 32 位元組隨機值的 Base64URL 編碼，摘要以解碼後的原始位元組計算；
+        格式不正確時回傳 None
         
-        # 產生隨機 Token
-        token = secrets.token_urlsafe(32)
-        token_hash = hashlib.sha256(token.encode()).hexdigest()
+        Token 明文不會被直接比較：資料庫以摘要等值查詢索引，摘要為單向值，
+        比對時間不會洩漏 Token 本身；需在 Python 端比較秘密值時一律使用 hmac.compare_digest
+        """
+        if not _MIN_TOKEN_LENGTH <= len(token) <= _MAX_TOKEN_LENGTH:
+            return None
+        try:
+            raw = base64.b64decode(token + "=" * (-len(token) % 4), altchars=b"-_", validate=True)
+        except (ValueError, binascii.Error):
+            return None
+        if len(raw) != 32:
+            return None
+        return _refresh_token_digest(raw)
+    
+    @staticmethod
+    def _generate_refresh_token(now: Optional[datetime] = None) -> Tuple[str, bytes, datetime]:
+        """產生新的重新整理 Token，回傳 (Token, 摘要, 過期時間)；now 為呼叫端已取得的目前 UTC 時間"""
+        # 產生隨機位元組，直接對原始位元組計算摘要，僅在回傳給用戶端時編碼
+        raw = secrets.token_bytes(32)
+        token_hash = _refresh_token_digest(raw)
+        token = _b64url(raw).decode()
         
         # 設定過期時間 (使用 UTC 時間進行內部計算)
-        expires_at = get_utc_now() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+        expires_at = (now or get_utc_now()) + _REFRESH_TOKEN_EXPIRE
+        
+        return token, token_hash, expires_at
+    
+    @staticmethod
+    def create_refresh_token(user_id: int, now: Optional[datetime] = None, record_login: bool = False) -> str:
+        """
+        建立重新整理 Token；now 為呼叫端已取得的目前 UTC 時間，同時作為建立時間
+        
+        record_login 為 True 時於同一次資料庫往返中一併更新使用者的最後登入時間
+        """
+        now = now or get_utc_now()
+        token, token_hash, expires_at = AuthService._generate_refresh_token(now)
         
         # 儲存到資料庫
-        RefreshTokenRepository.create_refresh_token(user_id, token_hash, expires_at)
+        if record_login:
+            RefreshTokenRepository.create_login_refresh_token(user_id, token_hash, expires_at, now)
+        else:
+            RefreshTokenRepository.create_refresh_token(user_id, token_hash, expires_at, created_at=now)
         
         return token
     
     @staticmethod
     def verify_token(token: str) -> Optional[TokenData]:
         """驗證 Token"""
-        import logging
-        logger = logging.getLogger(__name__)
+        verified = AuthService.verify_token_with_payload(token)
+        return verified[0] if verified is not None else None
+    
+    @staticmethod
+    def verify_token_with_payload(token: str) -> Optional[Tuple[TokenData, Dict[str, Any]]]:
+        """
+        驗證 Token 並一併回傳解碼後的 payload
+        
+        驗證結果連同 payload 快取至 Token 到期（最長 TOKEN_CACHE_TTL_SECONDS 秒），
+        命中快取時不需重新解碼與驗證簽章
+        """
+        if not _MIN_TOKEN_LENGTH <= len(token) <= _MAX_TOKEN_LENGTH:
+            logger.warning("🔐 Token 長度超出範圍: %d", len(token))
+            return None
+        
+        # 命中快取時直接回傳，不重新解碼（驗證失敗的結果不會被快取）
+        cache_key = hashlib.sha256(token.encode()).digest()
+        cached = _verified_cache.get(cache_key)
+        if cached is not None:
+            return cached
         
         try:
-            logger.debug(f"🔐 開始驗證 JWT Token (長度: {len(token)})")
-            logger.debug(f"🔐 Token 前20字符: {token[:20]}...")
-            logger.debug(f"🔐 使用密鑰: {settings.SECRET_KEY[:10]}...")
-            logger.debug(f"🔐 使用算法: {settings.ALGORITHM}")
-            
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-            logger.debug(f"🔐 JWT 解碼成功，payload: {payload}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("🔐 開始驗證 JWT Token (長度: %d)", len(token))
+                logger.debug("🔐 Token 前20字符: %s...", token[:20])
+                logger.debug("🔐 使用密鑰: %s...", _SECRET_KEY[:10])
+                logger.debug("🔐 使用算法: %s", _ALGORITHM)
             
-            user_id_str: str = payload.get("sub")
-            email: str = payload.get("email")
-            token_type: str = payload.get("type")
-            
-            # 將字符串類型的 user_id 轉換為整數
-            try:
-                user_id: int = int(user_id_str) if user_id_str else None
-            except (ValueError, TypeError):
-                logger.error(f"🔐 無法轉換 user_id: {user_id_str}")
-                return None
-            
-            logger.debug(f"🔐 提取資料 - user_id: {user_id}, email: {email}, type: {token_type}")
-            
-            if user_id is None or token_type != "access":
-                logger.warning(f"🔐 Token 驗證失敗 - user_id: {user_id}, token_type: {token_type}")
-                return None
-                
-            return TokenData(user_id=user_id, email=email)
+            # exp / sub / type 的存在性由 _decode_jwt 一併檢查
+            payload = _decode_jwt(token)
+            logger.debug("🔐 JWT 解碼成功，payload: %s", payload)
+        except jwt.PyJWTError as e:
+            logger.error("🔐 JWT 解碼錯誤: %s - %s", type(e).__name__, e)
+            return None
+        except Exception as e:
+            logger.error("🔐 Token 驗證異常: %s - %s", type(e).__name__, e)
+            return None
+        
+        token_data = AuthService.verify_payload(payload)
+        if token_data is None:
+            return None
+        verified = (token_data, payload)
+        _verified_cache.set(cache_key, verified, expires_at=payload.get("exp"))
+        return verified
+    
+    @staticmethod
+    def decode_token(token: str) -> Dict[str, Any]:
+        """
+        解碼並驗證 Token 簽章、必要 claim 與過期時間，回傳 payload
+        
+        已驗證過的 Token 直接回傳快取的 payload；不檢查 Token 類型，需搭配 verify_payload 使用
+        
+        Raises:
+            jwt.PyJWTError: Token 格式、簽章或 claim 不正確
+        """
+        if not _MIN_TOKEN_LENGTH <= len(token) <= _MAX_TOKEN_LENGTH:
+            raise jwt.DecodeError("Invalid token length")
+        cached = _verified_cache.get(hashlib.sha256(token.encode()).digest())
+        if cached is not None:
+            return cached[1]
+        return _decode_jwt(token)
+    
+    @staticmethod
+    def verify_payload(payload: Dict[str, Any]) -> Optional[TokenData]:
+        """
+        驗證已解碼 payload 的內容，回傳 Token 資料
+        
+        檢查 Token 類型必須為 access，sub 須為數字形式的 user_id；不符合時回傳 None
+        """
+        try:
+            if payload.get("type") != "access":
+                raise jwt.InvalidTokenError("Token type is not 'access'")
             
-        except JWTError as e:
-            logger.error(f"🔐 JWT 解碼錯誤: {type(e).__name__} - {str(e)}")
+            # sub 為字串形式的 user_id，由 TokenData 轉換為整數（非數字時驗證失敗）
+            return TokenData(user_id=payload["sub"], email=payload.get("email"))
+        except jwt.PyJWTError as e:
+            logger.error("🔐 JWT 內容錯誤: %s - %s", type(e).__name__, e)
             return None
         except Exception as e:
-            logger.error(f"🔐 Token 驗證異常: {type(e).__name__} - {str(e)}")
+            logger.error("🔐 Token 驗證異常: %s - %s", type(e).__name__, e)
             return None
     
+    @staticmethod
+    def invalidate_access_token(token: str):
+        """
+        移除存取 Token 的驗證快取
+        
+        Note:
+            用於登出時，確保之後使用此 Token 的請求會重新驗證
+        """
+        _verified_cache.pop(hashlib.sha256(token.encode()).digest(), None)
+    
     @staticmethod
     def refresh_access_token(refresh_token: str, rotate_refresh_token: bool = True) -> Optional[Dict[str, str]]:
         """使用重新整理 Token 取得新的存取 Token，並可選擇性地輪替 refresh token"""
-        token_hash = hashlib.sha256(refresh_token.encode()).hexdigest()
-        token_data = RefreshTokenRepository.get_refresh_token(token_hash)
+        # 長度與格式不符的 Token 由 hash_refresh_token 直接拒絕，不會進行資料庫查詢
+        token_hash = AuthService.hash_refresh_token(refresh_token)
+        if token_hash is None:
+            return None
+        
+        if rotate_refresh_token:
+            # Token Rotation: 在同一次資料庫往返中撤銷舊的 refresh token 並建立新的
+            new_refresh_token, new_token_hash, expires_at = AuthService._generate_refresh_token()
+            token_data = RefreshTokenRepository.rotate_refresh_token(token_hash, new_token_hash, expires_at)
+        else:
+            token_data = RefreshTokenRepository.get_refresh_token(token_hash)
         
         if not token_data:
             return None
@@ -150,37 +422,71 @@ class AuthService:
             "token_type": "bearer"
         }
         
-        # Token Rotation: 產生新的 refresh token 並撤銷舊的
         if rotate_refresh_token:
-            # 撤銷舊的 refresh token
-            RefreshTokenRepository.revoke_refresh_token(token_hash)
-            
-            # 建立新的 refresh token
-            new_refresh_token = AuthService.create_refresh_token(token_data["user_id"])
             result["refresh_token"] = new_refresh_token
         
         return result
     
     @staticmethod
-    def authenticate_user(email: str, password: str) -> Optional[Dict[str, Any]]:
+    async def refresh_access_token_coalesced(refresh_token: str) -> Optional[Dict[str, str]]:
+        """
+        以單一輪替處理同一 refresh token 的並行重新整理請求
+        
+        第一個請求在執行緒池中執行輪替，其餘請求等待並取得相同的新 Token；
+        避免多個分頁同時重新整理時重複寫入資料庫，以及舊 Token 撤銷後其餘請求失敗
+        
+        輪替發生例外（例如資料庫中斷）時，等待中的請求收到相同的例外而非 None，
+        不會把暫時性的伺服器錯誤當成無效的 Token 回應 401
+        """
+        token_hash = AuthService.hash_refresh_token(refresh_token)
+        if token_hash is None:
+            return None
+        
+        inflight = _refresh_inflight.get(token_hash)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+        
+        future = asyncio.get_running_loop().create_future()
+        _refresh_inflight[token_hash] = future
+        try:
+            result = await run_in_threadpool(AuthService.refresh_access_token, refresh_token, True)
+        except BaseException as exc:
+            # 第一個請求被取消時，等待中的請求無法得知輪替結果，改以伺服器錯誤回應
+            future.set_exception(
+                exc if isinstance(exc, Exception) else RuntimeError("Refresh token rotation was cancelled")
+            )
+            future.exception()  # 標記例外已取得，沒有等待中的請求時不會記錄「never retrieved」
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            _refresh_inflight.pop(token_hash, None)
+    
+    @staticmethod
+    async def authenticate_user(email: str, password: str) -> Optional[Dict[str, Any]]:
         """驗證使用者登入"""
-        user = UserRepository.get_user_by_email(email)
+        user = await run_in_threadpool(UserRepository.get_user_by_email, email)
         if not user:
             return None
-        if not AuthService.verify_password(password, user["password_hash"]):
+        if not await AuthService.verify_password(password, user["password_hash"]):
             return None
+        
+        # 雜湊參數（如 parallelism）變更後，於登入成功時以目前參數重新雜湊
+        if password_hasher.check_needs_rehash(user["password_hash"]):
+            try:
+                new_hash = await AuthService.get_password_hash(password)
+                await run_in_threadpool(UserRepository.update_password_hash, user["id"], new_hash)
+                user["password_hash"] = new_hash
+            except Exception as e:
+                logger.warning("🔐 密碼重新雜湊失敗，使用者 ID: %s - %s", user["id"], e)
         return user
 
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Dict[str, Any]:
+async def get_current_user(token: str = Depends(bearer_token)) -> Dict[str, Any]:
     """取得當前使用者依賴"""
-    from app.utils import ResponseHelper
-    import logging
-    logger = logging.getLogger(__name__)
-    
     try:
-        token = credentials.credentials
-        logger.debug(f"👤 開始驗證使用者，Token 長度: {len(token)}")
+        logger.debug("👤 開始驗證使用者，Token 長度: %d", len(token))
         
         token_data = AuthService.verify_token(token)
         
@@ -192,23 +498,25 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
-        logger.debug(f"👤 Token 驗證成功，查找使用者 ID: {token_data.user_id}")
-        user = UserRepository.get_user_by_id(token_data.user_id)
+        logger.debug("👤 Token 驗證成功，查找使用者 ID: %s", token_data.user_id)
+        user = UserRepository.get_cached_user_by_id(token_data.user_id)
+        if user is None:
+            user = await run_in_threadpool(UserRepository.get_user_by_id, token_data.user_id)
         if user is None:
-            logger.warning(f"👤 使用者不存在，ID: {token_data.user_id}")
+            logger.warning("👤 使用者不存在，ID: %s", token_data.user_id)
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="使用者不存在",
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
-        logger.debug(f"👤 使用者驗證成功: {user['email']}")
+        logger.debug("👤 使用者驗證成功: %s", user["email"])
         return user
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"👤 Token 驗證異常: {type(e).__name__} - {str(e)}")
+        logger.error("👤 Token 驗證異常: %s - %s", type(e).__name__, e)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail=f"Token 驗證錯誤: {str(e)}",
@@ -34,6 +34,18 @@ class Settings(BaseSettings):
     REFRESH_TOKEN_EXPIRE_DAYS: int = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
     """重新整理 Token 過期時間（天）"""
     
+    TOKEN_CACHE_TTL_SECONDS: int = int(os.getenv("TOKEN_CACHE_TTL_SECONDS", "5"))
+    """已驗證存取 Token 的快取時間（秒），實際不會超過 Token 本身的過期時間"""
+    
+    TOKEN_CACHE_MAX_SIZE: int = int(os.getenv("TOKEN_CACHE_MAX_SIZE", "10000"))
+    """已驗證存取 Token 快取的最大筆數"""
+    
+    USER_CACHE_TTL_SECONDS: int = int(os.getenv("USER_CACHE_TTL_SECONDS", "10"))
+    """依 ID 查詢的使用者資料快取時間（秒）"""
+    
+    USER_CACHE_MAX_SIZE: int = int(os.getenv("USER_CACHE_MAX_SIZE", "10000"))
+    """使用者資料快取的最大筆數"""
+    
     # 資料庫連接設定
     DB_SERVER: str = os.getenv("DB_SERVER", "your-server.database.windows.net")
     """Azure SQL 資料庫伺服器位址"""
@@ -47,24 +59,38 @@ class Settings(BaseSettings):
     DB_PASSWORD: str = os.getenv("DB_PASSWORD", "")
     """資料庫密碼 - 必須透過環境變數設定"""
     
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    """連接池保留的閒置連接數上限"""
+    
+    DB_POOL_MAX_IDLE_SECONDS: int = int(os.getenv("DB_POOL_MAX_IDLE_SECONDS", "180"))
+    """連接池中連接可閒置的最長時間（秒），超過時關閉並重新建立，避免使用已被伺服器或網路設備中斷的連接"""
+    
     # OAuth 第三方登入設定（選填）
+    # 伺服器只以前端取得的 OAuth access token 呼叫提供者 API 驗證，不需要客戶端 ID 與密鑰；
+    # 以下客戶端設定已不再使用，僅保留讓既有 .env 檔案仍可載入（Settings 不接受未定義的欄位）
     GOOGLE_CLIENT_ID: Optional[str] = None
-    """Google OAuth 客戶端 ID"""
+    """未使用 - Google OAuth 客戶端 ID"""
     
     GOOGLE_CLIENT_SECRET: Optional[str] = None
-    """Google OAuth 客戶端密鑰"""
+    """未使用 - Google OAuth 客戶端密鑰"""
     
     FACEBOOK_CLIENT_ID: Optional[str] = None
-    """Facebook OAuth 應用程式 ID"""
+    """未使用 - Facebook OAuth 應用程式 ID"""
     
     FACEBOOK_CLIENT_SECRET: Optional[str] = None
-    """Facebook OAuth 應用程式密鑰"""
+    """未使用 - Facebook OAuth 應用程式密鑰"""
     
     GITHUB_CLIENT_ID: Optional[str] = None
-    """GitHub OAuth 應用程式 ID"""
+    """未使用 - GitHub OAuth 應用程式 ID"""
     
     GITHUB_CLIENT_SECRET: Optional[str] = None
-    """GitHub OAuth 應用程式密鑰"""
+    """未使用 - GitHub OAuth 應用程式密鑰"""
+    
+    OAUTH_USERINFO_CACHE_TTL_SECONDS: int = int(os.getenv("OAUTH_USERINFO_CACHE_TTL_SECONDS", "300"))
+    """OAuth 提供者使用者資訊的快取時間（秒），同一 OAuth Token 在此期間內不會重複查詢提供者"""
+    
+    OAUTH_USERINFO_CACHE_MAX_SIZE: int = int(os.getenv("OAUTH_USERINFO_CACHE_MAX_SIZE", "10000"))
+    """OAuth 使用者資訊快取的最大筆數"""
     
     # 應用程式 URL 設定
     FRONTEND_URL: str = "http://localhost:3000"
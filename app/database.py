@@ -9,30 +9,97 @@
 
 使用 pymssql 驅動程式連接 SQL Server，並提供安全的參數化查詢功能
 """
+import queue
+import time
 import pymssql
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 from contextlib import contextmanager
 from app.config import settings
-import hashlib
+from app.utils import TTLCache, get_utc_now
 from datetime import datetime
 
 
+# users 查詢欄位 - 明確列出下游需要的欄位，避免 SELECT * 傳輸多餘資料並讓查詢可使用涵蓋索引
+_USER_COLUMNS = (
+    "id, email, username, password_hash, is_active, provider, provider_id, "
+    "created_at, updated_at, last_login"
+)
+
+# 批次操作每個 IN 清單的參數數量上限 - SQL Server 單一語句最多 2100 個參數
+_BULK_CHUNK_SIZE = 1000
+
+# 資料庫連接池 - 重用已建立的連接，避免每次查詢都重新進行 TCP、TLS 與登入交握
+# 每筆為 (連接, 歸還時間)，歸還時間以 time.monotonic() 記錄，用於判斷閒置是否過久
+_connection_pool: "queue.LifoQueue[Tuple[pymssql.Connection, float]]" = queue.LifoQueue(
+    maxsize=settings.DB_POOL_SIZE
+)
+
+# 使用者資料快取 - 讓每個已認證請求的 get_user_by_id 在短時間內免去資料庫往返
+_user_cache = TTLCache(
+    maxsize=settings.USER_CACHE_MAX_SIZE,
+    ttl=settings.USER_CACHE_TTL_SECONDS
+)
+
+
 class DatabaseManager:
     """
     資料庫管理類別
     
     提供資料庫連接、查詢執行等核心功能
-    使用上下文管理器確保連接的正確開啟和關閉
+    使用上下文管理器從連接池取得連接，並在使用後歸還
     """
     
+    @staticmethod
+    def _connect() -> pymssql.Connection:
+        """建立新的資料庫連接"""
+        return pymssql.connect(
+            server=settings.DB_SERVER,
+            user=settings.DB_USERNAME,
+            password=settings.DB_PASSWORD,
+            database=settings.DB_DATABASE,
+            charset='UTF-8'  # 確保支援中文字符
+        )
+    
+    @staticmethod
+    def _discard(connection: pymssql.Connection):
+        """回滾並關閉連接，不放回連接池"""
+        try:
+            connection.rollback()
+        except Exception:
+            pass
+        try:
+            connection.close()
+        except Exception:
+            pass
+    
+    @staticmethod
+    def _acquire() -> pymssql.Connection:
+        """
+        從連接池取得可重用的連接，沒有時建立新連接
+        
+        閒置超過 DB_POOL_MAX_IDLE_SECONDS 的連接可能已被 Azure SQL 或網路設備中斷，直接關閉不再使用
+        """
+        deadline = time.monotonic() - settings.DB_POOL_MAX_IDLE_SECONDS
+        while True:
+            try:
+                connection, returned_at = _connection_pool.get_nowait()
+            except queue.Empty:
+                return DatabaseManager._connect()
+            if returned_at >= deadline:
+                return connection
+            try:
+                connection.close()
+            except Exception:
+                pass
+    
     @staticmethod
     @contextmanager
     def get_connection():
         """
         取得資料庫連接的上下文管理器
         
-        使用 contextmanager 裝飾器確保資料庫連接在使用後正確關閉
-        出現異常時會自動回滾交易
+        優先從連接池取得閒置連接（閒置過久的連接會被關閉），沒有時才建立新連接
+        正常結束時提交交易並將連接歸還連接池；出現異常時回滾並捨棄該連接
         
         Yields:
             pymssql.Connection: 資料庫連接物件
@@ -42,21 +109,36 @@ class DatabaseManager:
         """
         connection = None
         try:
-            connection = pymssql.connect(
-                server=settings.DB_SERVER,
-                user=settings.DB_USERNAME,
-                password=settings.DB_PASSWORD,
-                database=settings.DB_DATABASE,
-                charset='UTF-8'  # 確保支援中文字符
-            )
+            connection = DatabaseManager._acquire()
             yield connection
-        except Exception as e:
-            if connection:
-                connection.rollback()  # 發生錯誤時回滾交易
-            raise e
-        finally:
+            connection.commit()  # 結束交易，避免連接在池中保留未完成的交易
+        except Exception:
             if connection:
-                connection.close()  # 確保連接被正確關閉
+                DatabaseManager._discard(connection)  # 連接狀態不明，不放回連接池
+            raise
+        else:
+            try:
+                _connection_pool.put_nowait((connection, time.monotonic()))
+            except queue.Full:
+                connection.close()  # 連接池已滿，直接關閉多餘的連接
+    
+    @staticmethod
+    def close_pool():
+        """
+        關閉連接池中所有閒置連接
+        
+        Note:
+            於應用程式關閉時呼叫
+        """
+        while True:
+            try:
+                connection, _ = _connection_pool.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                connection.close()
+            except Exception:
+                pass
     
     @staticmethod
     def execute_query(query: str, params: tuple = None) -> List[Dict[str, Any]]:
@@ -179,7 +261,7 @@ class UserRepository:
         Note:
             只回傳啟用狀態的使用者（is_active = 1）
         """
-        query = "SELECT * FROM users WHERE email = %s AND is_active = 1"
+        query = f"SELECT {_USER_COLUMNS} FROM users WHERE email = %s AND is_active = 1"
         users = DatabaseManager.execute_query(query, (email,))
         return users[0] if users else None
     
@@ -195,11 +277,49 @@ class UserRepository:
             Optional[Dict[str, Any]]: 使用者資訊字典，找不到則回傳 None
             
         Note:
-            只回傳啟用狀態的使用者（is_active = 1）
+            - 只回傳啟用狀態的使用者（is_active = 1）
+            - 結果會快取 USER_CACHE_TTL_SECONDS 秒，修改使用者資料時需呼叫 invalidate_user_cache
+            - 回傳快取資料的複本，呼叫端修改回傳值不會影響快取
         """
-        query = "SELECT * FROM users WHERE id = %s AND is_active = 1"
+        user = _user_cache.get(user_id)
+        if user is not None:
+            return dict(user)
+        
+        query = f"SELECT {_USER_COLUMNS} FROM users WHERE id = %s AND is_active = 1"
         users = DatabaseManager.execute_query(query, (user_id,))
-        return users[0] if users else None
+        if not users:
+            return None
+        
+        _user_cache.set(user_id, users[0])
+        return dict(users[0])
+    
+    @staticmethod
+    def get_cached_user_by_id(user_id: int) -> Optional[Dict[str, Any]]:
+        """
+        只從快取取得使用者資訊，不查詢資料庫
+        
+        Args:
+            user_id (int): 使用者 ID
+            
+        Returns:
+            Optional[Dict[str, Any]]: 快取中的使用者資訊，未快取或已過期則回傳 None
+            
+        Note:
+            供非同步處理函式先在事件迴圈上檢查快取，未命中時才將 get_user_by_id 交給執行緒池；
+            與 get_user_by_id 相同，回傳快取資料的複本
+        """
+        user = _user_cache.get(user_id)
+        return dict(user) if user is not None else None
+    
+    @staticmethod
+    def invalidate_user_cache(user_id: int):
+        """
+        移除使用者資料快取
+        
+        Args:
+            user_id (int): 使用者 ID
+        """
+        _user_cache.pop(user_id)
     
     @staticmethod
     def get_user_by_provider(provider: str, provider_id: str) -> Optional[Dict[str, Any]]:
@@ -216,26 +336,93 @@ class UserRepository:
         Note:
             用於 OAuth 登入時查找對應的使用者帳戶
         """
-        query = "SELECT * FROM users WHERE provider = %s AND provider_id = %s AND is_active = 1"
+        query = f"SELECT {_USER_COLUMNS} FROM users WHERE provider = %s AND provider_id = %s AND is_active = 1"
         users = DatabaseManager.execute_query(query, (provider, provider_id))
         return users[0] if users else None
     
     @staticmethod
-    def update_user_login_time(user_id: int):
+    def update_user_login_time(user_id: int, now: Optional[datetime] = None):
         """
         更新使用者最後登入時間
         
         Args:
             user_id (int): 使用者 ID
+            now (datetime, optional): 呼叫端已取得的目前 UTC 時間，未提供時自行取得
             
         Note:
             同時更新 last_login 和 updated_at 欄位
         """
-        from app.utils import get_utc_now
-        
         query = "UPDATE users SET last_login = %s, updated_at = %s WHERE id = %s"
-        now = get_utc_now()  # 使用 UTC 時間統一時區
+        now = now or get_utc_now()  # 使用 UTC 時間統一時區
         DatabaseManager.execute_non_query(query, (now, now, user_id))
+        UserRepository.invalidate_user_cache(user_id)
+    
+    @staticmethod
+    def upsert_oauth_user(provider: str, provider_id: str, email: str, username: str, now: datetime) -> Optional[Dict[str, Any]]:
+        """
+        OAuth 登入時更新或建立使用者，並回傳使用者資訊
+        
+        Args:
+            provider (str): OAuth 提供者名稱（google, facebook, github）
+            provider_id (str): OAuth 提供者的使用者 ID
+            email (str): 使用者電子郵件地址
+            username (str): 使用者名稱
+            now (datetime): 目前 UTC 時間，寫入 last_login 與 updated_at
+            
+        Returns:
+            Optional[Dict[str, Any]]: 使用者資訊字典；電子郵件已被其他帳戶使用時回傳 None
+            
+        Note:
+            - 以單一 T-SQL 批次完成「查找提供者使用者 / 建立新使用者 / 更新登入時間」，只需一次資料庫往返
+            - 已有相同電子郵件的帳戶（其他登入方式）時不自動連結，也不建立新使用者
+            - 電子郵件檢查使用 UPDLOCK/HOLDLOCK，同一使用者的並行 OAuth 登入不會重複建立帳戶
+        """
+        query = f"""
+        SET NOCOUNT ON;
+        DECLARE @now DATETIME2 = %s;
+        DECLARE @user TABLE (id INT);
+        
+        UPDATE users SET last_login = @now, updated_at = @now
+        OUTPUT inserted.id INTO @user
+        WHERE provider = %s AND provider_id = %s AND is_active = 1;
+        
+        IF NOT EXISTS (SELECT 1 FROM @user)
+            AND NOT EXISTS (SELECT 1 FROM users WITH (UPDLOCK, HOLDLOCK) WHERE email = %s)
+            INSERT INTO users (email, username, password_hash, provider, provider_id, last_login, updated_at)
+            OUTPUT inserted.id INTO @user
+            VALUES (%s, %s, '', %s, %s, @now, @now);
+        
+        SELECT TOP 1 {_USER_COLUMNS} FROM users WHERE id IN (SELECT id FROM @user);
+        """
+        try:
+            rows = DatabaseManager.execute_query(
+                query,
+                (now, provider, provider_id, email, email, username, provider, provider_id)
+            )
+        except Exception:
+            # 並行建立時電子郵件唯一性衝突，視為建立失敗
+            return None
+        if not rows:
+            return None
+        
+        UserRepository.invalidate_user_cache(rows[0]["id"])
+        return rows[0]
+    
+    @staticmethod
+    def update_password_hash(user_id: int, password_hash: str):
+        """
+        更新使用者密碼雜湊值
+        
+        Args:
+            user_id (int): 使用者 ID
+            password_hash (str): 新的 Argon2id 雜湊值
+            
+        Note:
+            用於登入成功後以目前的雜湊參數重新雜湊舊密碼
+        """
+        query = "UPDATE users SET password_hash = %s, updated_at = %s WHERE id = %s"
+        DatabaseManager.execute_non_query(query, (password_hash, get_utc_now(), user_id))
+        UserRepository.invalidate_user_cache(user_id)
 
 
 class RefreshTokenRepository:
@@ -250,14 +437,15 @@ class RefreshTokenRepository:
     """
     
     @staticmethod
-    def create_refresh_token(user_id: int, token_hash: str, expires_at: datetime):
+    def create_refresh_token(user_id: int, token_hash: bytes, expires_at: datetime, created_at: Optional[datetime] = None):
         """
         建立新的重新整理 Token
         
         Args:
             user_id (int): 使用者 ID
-            token_hash (str): Token 的 SHA-256 雜湊值
+            token_hash (bytes): Token 的摘要（16 位元組）
             expires_at (datetime): Token 過期時間
+            created_at (datetime, optional): 建立時間，未提供時使用目前 UTC 時間
             
         Note:
             - Token 以雜湊值形式儲存，增強安全性
@@ -267,42 +455,103 @@ class RefreshTokenRepository:
         INSERT INTO refresh_tokens (user_id, token_hash, expires_at, created_at)
         VALUES (%s, %s, %s, %s)
         """
-        from app.utils import get_utc_now
-        DatabaseManager.execute_non_query(query, (user_id, token_hash, expires_at, get_utc_now()))
+        DatabaseManager.execute_non_query(query, (user_id, token_hash, expires_at, created_at or get_utc_now()))
     
     @staticmethod
-    def get_refresh_token(token_hash: str) -> Optional[Dict[str, Any]]:
+    def create_login_refresh_token(user_id: int, token_hash: bytes, expires_at: datetime, now: datetime):
+        """
+        登入時建立新的重新整理 Token，並更新使用者最後登入時間
+        
+        Args:
+            user_id (int): 使用者 ID
+            token_hash (bytes): Token 的摘要（16 位元組）
+            expires_at (datetime): Token 過期時間
+            now (datetime): 目前 UTC 時間，作為 Token 建立時間與使用者的 last_login、updated_at
+            
+        Note:
+            以單一 T-SQL 批次完成，登入只需一次寫入的資料庫往返
+        """
+        query = """
+        SET NOCOUNT ON;
+        UPDATE users SET last_login = %s, updated_at = %s WHERE id = %s;
+        INSERT INTO refresh_tokens (user_id, token_hash, expires_at, created_at)
+        VALUES (%s, %s, %s, %s);
+        """
+        DatabaseManager.execute_non_query(query, (now, now, user_id, user_id, token_hash, expires_at, now))
+        UserRepository.invalidate_user_cache(user_id)
+    
+    @staticmethod
+    def get_refresh_token(token_hash: bytes) -> Optional[Dict[str, Any]]:
         """
         取得有效的重新整理 Token 資訊
         
         Args:
-            token_hash (str): Token 的 SHA-256 雜湊值
+            token_hash (bytes): Token 的 SHA-256 摘要
             
         Returns:
             Optional[Dict[str, Any]]: Token 資訊及關聯的使用者資訊，無效則回傳 None
             
         Note:
-            - 檢查 Token 是否過期
+            - 檢查 Token 是否過期（以資料庫端的 SYSUTCDATETIME() 比較，不需傳入目前時間）
             - 檢查 Token 是否已被撤銷
             - 同時回傳使用者的 email 和 username
+            - 條件皆可由 token_hash 的唯一涵蓋索引直接判斷
         """
         query = """
-        SELECT rt.*, u.email, u.username 
+        SELECT rt.user_id, rt.expires_at, u.email, u.username
         FROM refresh_tokens rt
         JOIN users u ON rt.user_id = u.id
-        WHERE rt.token_hash = %s AND rt.expires_at > %s AND rt.is_revoked = 0
+        WHERE rt.token_hash = %s AND rt.expires_at > SYSUTCDATETIME() AND rt.is_revoked = 0
         """
-        from app.utils import get_utc_now
-        tokens = DatabaseManager.execute_query(query, (token_hash, get_utc_now()))
+        tokens = DatabaseManager.execute_query(query, (token_hash,))
         return tokens[0] if tokens else None
     
     @staticmethod
-    def revoke_refresh_token(token_hash: str):
+    def rotate_refresh_token(old_token_hash: bytes, new_token_hash: bytes, expires_at: datetime) -> Optional[Dict[str, Any]]:
+        """
+        輪替重新整理 Token：撤銷舊 Token、建立新 Token 並回傳使用者資訊
+        
+        Args:
+            old_token_hash (bytes): 目前 Token 的 SHA-256 摘要
+            new_token_hash (bytes): 新 Token 的 SHA-256 摘要
+            expires_at (datetime): 新 Token 過期時間
+            
+        Returns:
+            Optional[Dict[str, Any]]: 使用者的 user_id、email、username，舊 Token 無效則回傳 None
+            
+        Note:
+            - 以單一 T-SQL 批次在同一個交易中完成，只需一次資料庫往返
+            - 只有未過期且未撤銷的舊 Token 會被輪替，同一 Token 不會被成功輪替兩次
+            - 過期判斷與建立時間皆使用資料庫端的 SYSUTCDATETIME()
+        """
+        query = """
+        SET NOCOUNT ON;
+        DECLARE @rotated TABLE (user_id INT);
+        
+        UPDATE refresh_tokens SET is_revoked = 1
+        OUTPUT inserted.user_id INTO @rotated
+        WHERE token_hash = %s AND expires_at > SYSUTCDATETIME() AND is_revoked = 0;
+        
+        INSERT INTO refresh_tokens (user_id, token_hash, expires_at, created_at)
+        SELECT user_id, %s, %s, SYSUTCDATETIME() FROM @rotated;
+        
+        SELECT u.id AS user_id, u.email, u.username
+        FROM @rotated r
+        JOIN users u ON r.user_id = u.id;
+        """
+        rows = DatabaseManager.execute_query(
+            query,
+            (old_token_hash, new_token_hash, expires_at)
+        )
+        return rows[0] if rows else None
+    
+    @staticmethod
+    def revoke_refresh_token(token_hash: bytes):
         """
         撤銷重新整理 Token
         
         Args:
-            token_hash (str): 要撤銷的 Token 雜湊值
+            token_hash (bytes): 要撤銷的 Token 摘要
             
         Note:
             將 is_revoked 欄位設為 1，Token 立即失效
@@ -320,6 +569,40 @@ class RefreshTokenRepository:
             
         Note:
             用於使用者登出時撤銷所有 Token，或安全事件發生時強制登出
+            已撤銷的 Token 會被略過，減少不必要的寫入與鎖定
+        """
+        query = "UPDATE refresh_tokens SET is_revoked = 1 WHERE user_id = %s AND is_revoked = 0"
+        DatabaseManager.execute_non_query(query, (user_id,))
+    
+    @staticmethod
+    def revoke_all_user_tokens_bulk(user_ids: List[int]) -> int:
         """
-        query = "UPDATE refresh_tokens SET is_revoked = 1 WHERE user_id = %s"
-        DatabaseManager.execute_non_query(query, (user_id,)) 
\ No newline at end of file
+        批次撤銷多位使用者的所有重新整理 Token
+        
+        Args:
+            user_ids (List[int]): 使用者 ID 列表
+            
+        Returns:
+            int: 被撤銷的 Token 數量
+            
+        Note:
+            用於安全事件發生時一次強制登出大量使用者
+            ID 以每 1000 個為一組組成 IN 清單，所有語句使用同一個連接並在同一個交易中提交
+        """
+        ids = list(dict.fromkeys(user_ids))  # 去除重複並保留順序
+        if not ids:
+            return 0
+        
+        revoked = 0
+        with DatabaseManager.get_connection() as conn:
+            cursor = conn.cursor()
+            for start in range(0, len(ids), _BULK_CHUNK_SIZE):
+                chunk = ids[start:start + _BULK_CHUNK_SIZE]
+                placeholders = ", ".join(["%s"] * len(chunk))
+                cursor.execute(
+                    f"UPDATE refresh_tokens SET is_revoked = 1 "
+                    f"WHERE user_id IN ({placeholders}) AND is_revoked = 0",
+                    tuple(chunk)
+                )
+                revoked += cursor.rowcount
+        return revoked 
\ No newline at end of file
@@ -1,42 +1,122 @@
 """
 FastAPI JWT Authentication Server 主應用程式
 """
+import atexit
 import os
+import sys
+import ssl
+import asyncio
+import gzip
+import queue
+import time
+import hashlib
 import logging
-from datetime import datetime
+import logging.handlers
 from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.staticfiles import StaticFiles
+from fastapi.responses import HTMLResponse, ORJSONResponse, Response
+from starlette.routing import Route
 from contextlib import asynccontextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import FrozenSet, Optional
+import orjson
+
+try:
+    import brotli
+except ImportError:  # 未安裝時測試頁面僅提供 gzip 壓縮
+    brotli = None
 
 from app.config import settings
+from app.database import DatabaseManager
+from app.oauth import OAuthService
 from app.routers import auth
+from app.utils import ResponseHelper, get_response_timestamp
+
+# 執行環境 - 於載入時判斷一次，供日誌、生命週期、CORS 等設定共用
+IS_DEV = os.getenv("ENVIRONMENT", "development") == "development"
+
+
+def _install_event_loop_policy() -> str:
+    """
+    在建立事件迴圈之前安裝較快的事件迴圈實作
+    
+    OAuth 流程以對外 HTTPS 請求為主，事件迴圈的系統呼叫開銷直接影響延遲；
+    優先使用 io_uring 的 uringcore（Linux 5.11+，選用套件），其次為 uvloop，皆無法使用時保留 asyncio 預設迴圈
+    
+    只在以 python -m app.main 執行時呼叫，載入本模組不會變更整個程序的事件迴圈 policy；
+    以 uvicorn 指令啟動時請改用 --loop uvloop
+    """
+    if sys.platform == "win32":
+        return "asyncio"
+    try:
+        import uringcore
+        asyncio.set_event_loop_policy(uringcore.EventLoopPolicy())
+        return "uringcore"
+    except ImportError:
+        pass
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        return "uvloop"
+    except ImportError:
+        return "asyncio"
+
 
 # 設定日誌記錄
-if os.getenv("ENVIRONMENT", "development") == "development":
-    logging.basicConfig(
-        level=logging.DEBUG,
-        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+# 記錄只放入佇列，由 QueueListener 的背景執行緒格式化並寫出，呼叫端不需等待輸出鎖與 I/O
+# listener 與 QueueHandler 同時啟動（不依賴 lifespan），程序結束時由 atexit 停止並寫出剩餘記錄；
+# 以 python -m app.main 執行時本模組會被載入兩次（__main__ 與 app.main），因此沿用已掛上的 QueueHandler 與其 listener
+_LOG_FORMATTER = logging.Formatter(
+    "%(asctime)s - %(name)s - %(levelname)s - %(message)s" if IS_DEV
+    else "%(asctime)s - %(levelname)s - %(message)s"
+)
+if not any(isinstance(h, logging.handlers.QueueHandler) for h in logging.root.handlers):
+    _log_handler = logging.StreamHandler()
+    _log_handler.setFormatter(_LOG_FORMATTER)
+    _log_queue_handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+    _log_listener = logging.handlers.QueueListener(
+        _log_queue_handler.queue, _log_handler, respect_handler_level=True
     )
-    logger = logging.getLogger(__name__)
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
+    logging.root.addHandler(_log_queue_handler)
+logging.root.setLevel(logging.DEBUG if IS_DEV else logging.INFO)
+
+logger = logging.getLogger(__name__)
+if IS_DEV:
     logger.debug("🔧 開發模式：啟用詳細日誌記錄")
-else:
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s - %(levelname)s - %(message)s"
-    )
-    logger = logging.getLogger(__name__)
+
+
+async def openapi_json(request: Request) -> Response:
+    """回傳啟動時預先序列化的 OpenAPI 文件"""
+    return Response(request.app.state.openapi_json, media_type="application/json")
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """應用程式生命週期管理"""
     # 啟動時執行
-    if os.getenv("ENVIRONMENT", "development") == "development":
+    # 預先產生 OpenAPI 文件並序列化為 bytes，避免第一個 /docs 請求才走訪所有路由與模型
+    app.state.openapi_json = orjson.dumps(app.openapi())
+    
+    # 路由於載入時皆已註冊完成，凍結為 tuple 供每次請求的路由比對走訪；
+    # 同時將預設的 OpenAPI 路由替換為回傳預先序列化內容的版本
+    app.router.routes = tuple(
+        Route(app.openapi_url, openapi_json, include_in_schema=False)
+        if isinstance(route, Route) and route.path == app.openapi_url else route
+        for route in app.router.routes
+    )
+    if IS_DEV:
         logger.info("🚀 FastAPI JWT Authentication Server 啟動中 (開發模式)...")
-        logger.debug(f"資料庫伺服器: {settings.DB_SERVER}")
-        logger.debug(f"資料庫名稱: {settings.DB_DATABASE}")
-        logger.debug(f"JWT 過期時間: {settings.ACCESS_TOKEN_EXPIRE_MINUTES} 分鐘")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("資料庫伺服器: %s", settings.DB_SERVER)
+            logger.debug("資料庫名稱: %s", settings.DB_DATABASE)
+            logger.debug("JWT 過期時間: %s 分鐘", settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+            logger.debug("OpenSSL 版本: %s", ssl.OPENSSL_VERSION)
+            logger.debug("hashlib 可用演算法: %s", sorted(hashlib.algorithms_guaranteed))
     else:
         logger.info("🚀 FastAPI JWT Authentication Server 啟動中...")
     
@@ -44,241 +124,66 @@ async def lifespan(app: FastAPI):
     
     # 關閉時執行
     logger.info("📴 FastAPI JWT Authentication Server 關閉中...")
+    DatabaseManager.close_pool()
+    await OAuthService.close_http_client()
 
 
 # 建立 FastAPI 應用程式實例
 app = FastAPI(
     title="FastAPI JWT Authentication Server",
-    description="使用 FastAPI 和 Authlib 的 JWT 認證服務器，支援 OAuth 整合",
+    description="使用 FastAPI 的 JWT 認證服務器，支援 OAuth 整合",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse  # 以 orjson 序列化 JSON 回應
 )
 
-# CORS 中間件設定
-allowed_origins = [settings.FRONTEND_URL, "http://localhost:3000", "http://127.0.0.1:3000"]
-if os.getenv("ENVIRONMENT", "development") == "development":
-    allowed_origins.extend(["http://localhost:8080", "http://127.0.0.1:8080"])
-    logger.debug(f"CORS 允許的來源: {allowed_origins}")
+# CORS 中間件設定 - 允許的來源於載入時整理為去除重複的 tuple
+ALLOWED_ORIGINS = tuple(dict.fromkeys((
+    settings.FRONTEND_URL,
+    "http://localhost:3000",
+    "http://127.0.0.1:3000",
+    *(("http://localhost:8080", "http://127.0.0.1:8080") if IS_DEV else ()),
+)))
+if IS_DEV:
+    logger.debug("CORS 允許的來源: %s", ALLOWED_ORIGINS)
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=allowed_origins,
+    allow_origins=ALLOWED_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
 # 註冊路由
-app.include_router(auth.router)
+app.include_router(auth.router, default_response_class=ORJSONResponse)
 
 
-@app.get("/test-login", summary="測試登入頁面")
-async def test_login_page():
-    """測試登入頁面，包含所有認證功能的測試界面"""
-    from fastapi.responses import HTMLResponse
+class _ImmutableStaticFiles(StaticFiles):
+    """靜態檔案 - 網址帶有內容版本參數，可讓瀏覽器長期快取"""
     
-    html_content = """
+    async def get_response(self, path: str, scope) -> Response:
+        response = await super().get_response(path, scope)
+        if response.status_code in (200, 304):
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
+
+# 靜態檔案（測試頁面的樣式表）
+_STATIC_DIR = Path(__file__).parent / "static"
+app.mount("/static", _ImmutableStaticFiles(directory=_STATIC_DIR), name="static")
+_CSS_VERSION = hashlib.sha1((_STATIC_DIR / "test-login.css").read_bytes()).hexdigest()[:12]
+
+
+# 測試登入頁面 - 內容固定不變，於載入時預先編碼為 UTF-8 位元組，避免每次請求重新建立字串並編碼
+_TEST_LOGIN_HTML: bytes = """
 <!DOCTYPE html>
 <html lang="zh-TW">
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>登入系統測試頁面</title>
-    <style>
-        * {
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }
-        
-        body {
-            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            min-height: 100vh;
-            padding: 20px;
-        }
-        
-        .container {
-            max-width: 1200px;
-            margin: 0 auto;
-            background: white;
-            border-radius: 15px;
-            box-shadow: 0 20px 40px rgba(0,0,0,0.1);
-            overflow: hidden;
-        }
-        
-        .header {
-            background: linear-gradient(135deg, #4facfe 0%, #00f2fe 100%);
-            color: white;
-            padding: 30px;
-            text-align: center;
-        }
-        
-        .header h1 {
-            font-size: 2.5em;
-            margin-bottom: 10px;
-        }
-        
-        .content {
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(350px, 1fr));
-            gap: 30px;
-            padding: 30px;
-        }
-        
-        .section {
-            background: #f8f9fa;
-            padding: 25px;
-            border-radius: 10px;
-            border: 1px solid #e9ecef;
-        }
-        
-        .section h2 {
-            color: #495057;
-            margin-bottom: 20px;
-            border-bottom: 2px solid #007bff;
-            padding-bottom: 10px;
-        }
-        
-        .input-group {
-            margin-bottom: 15px;
-        }
-        
-        .input-group label {
-            display: block;
-            margin-bottom: 5px;
-            font-weight: 600;
-            color: #495057;
-        }
-        
-        .input-group input, .input-group select {
-            width: 100%;
-            padding: 12px;
-            border: 2px solid #e9ecef;
-            border-radius: 5px;
-            font-size: 16px;
-            transition: border-color 0.3s;
-        }
-        
-        .input-group input:focus, .input-group select:focus {
-            outline: none;
-            border-color: #007bff;
-        }
-        
-        .btn {
-            background: linear-gradient(135deg, #007bff, #0056b3);
-            color: white;
-            border: none;
-            padding: 12px 25px;
-            border-radius: 5px;
-            cursor: pointer;
-            font-size: 16px;
-            font-weight: 600;
-            transition: transform 0.2s, box-shadow 0.2s;
-            margin-right: 10px;
-            margin-bottom: 10px;
-        }
-        
-        .btn:hover {
-            transform: translateY(-2px);
-            box-shadow: 0 5px 15px rgba(0,123,255,0.4);
-        }
-        
-        .btn.danger {
-            background: linear-gradient(135deg, #dc3545, #c82333);
-        }
-        
-        .btn.success {
-            background: linear-gradient(135deg, #28a745, #1e7e34);
-        }
-        
-        .btn.warning {
-            background: linear-gradient(135deg, #ffc107, #e0a800);
-            color: #212529;
-        }
-        
-        .response {
-            margin-top: 20px;
-            padding: 15px;
-            border-radius: 5px;
-            font-family: monospace;
-            font-size: 14px;
-            max-height: 300px;
-            overflow-y: auto;
-        }
-        
-        .response.success {
-            background: #d4edda;
-            border: 1px solid #c3e6cb;
-            color: #155724;
-        }
-        
-        .response.error {
-            background: #f8d7da;
-            border: 1px solid #f5c6cb;
-            color: #721c24;
-        }
-        
-        .token-display {
-            background: #e3f2fd;
-            border: 1px solid #bbdefb;
-            padding: 15px;
-            border-radius: 5px;
-            margin-top: 15px;
-            word-break: break-all;
-            font-family: monospace;
-            font-size: 12px;
-        }
-        
-        .oauth-buttons {
-            display: flex;
-            gap: 10px;
-            flex-wrap: wrap;
-        }
-        
-        .oauth-btn {
-            flex: 1;
-            min-width: 100px;
-        }
-        
-        .oauth-btn.google {
-            background: linear-gradient(135deg, #db4437, #c23321);
-        }
-        
-        .oauth-btn.facebook {
-            background: linear-gradient(135deg, #4267B2, #365899);
-        }
-        
-        .oauth-btn.github {
-            background: linear-gradient(135deg, #333, #24292e);
-        }
-        
-        .user-info {
-            background: #fff3cd;
-            border: 1px solid #ffeaa7;
-            padding: 15px;
-            border-radius: 5px;
-            margin-top: 15px;
-        }
-        
-        .current-tokens {
-            background: #d1ecf1;
-            border: 1px solid #bee5eb;
-            padding: 15px;
-            border-radius: 5px;
-            margin-top: 15px;
-        }
-        
-        @media (max-width: 768px) {
-            .content {
-                grid-template-columns: 1fr;
-            }
-            
-            .header h1 {
-                font-size: 2em;
-            }
-        }
-    </style>
+    <link rel="stylesheet" href="/static/test-login.css?v=__CSS_VERSION__">
 </head>
 <body>
     <div class="container">
@@ -400,16 +305,37 @@ async def test_login_page():
     </div>
 
     <script>
+        // 元素參照快取 - 腳本位於 body 結尾，載入時所有元素皆已存在，一次查詢後重複使用
+        const els = {};
+        for (const el of document.querySelectorAll('[id]')) {
+            els[el.id] = el;
+        }
+        
         // Token 管理器
         class TokenManager {
+            // 在 Token 過期前 5 分鐘自動重新整理
+            static REFRESH_MARGIN_MS = 5 * 60 * 1000;
+            
             constructor() {
                 this.accessToken = null;
-                this.autoRefreshTimer = null;
+                this.expiresAt = 0;
+                this.refreshing = false;
+                
+                // 單一計時器每分鐘檢查一次，頁面隱藏時不重新整理；回到頁面時立即檢查
+                setInterval(() => this.checkAutoRefresh(), 60_000);
+                document.addEventListener('visibilitychange', () => this.checkAutoRefresh());
             }
             
             setAccessToken(token) {
                 this.accessToken = token;
-                this.scheduleAutoRefresh();
+                // 設定時解析一次 exp，之後只需比較時間戳記；無法解析時不自動重新整理
+                try {
+                    const payload = token.split('.')[1].replace(/-/g, '+').replace(/_/g, '/');
+                    const exp = JSON.parse(atob(payload)).exp;
+                    this.expiresAt = Number.isFinite(exp) ? exp * 1000 : Infinity;
+                } catch (e) {
+                    this.expiresAt = Infinity;
+                }
             }
             
             getAccessToken() {
@@ -418,40 +344,50 @@ async def test_login_page():
             
             clearAccessToken() {
                 this.accessToken = null;
-                if (this.autoRefreshTimer) {
-                    clearTimeout(this.autoRefreshTimer);
-                    this.autoRefreshTimer = null;
-                }
+                this.expiresAt = 0;
             }
             
-            scheduleAutoRefresh() {
-                // 在 Token 過期前 5 分鐘自動重新整理
-                const refreshTime = (30 - 5) * 60 * 1000; // 25 分鐘
-                if (this.autoRefreshTimer) {
-                    clearTimeout(this.autoRefreshTimer);
-                }
-                this.autoRefreshTimer = setTimeout(() => {
+            // 清除 access token 並更新頁面上的登入狀態
+            clearSession() {
+                this.clearAccessToken();
+                els['login-tokens'].style.display = 'none';
+                els['user-info-display'].style.display = 'none';
+                showCurrentTokenStatus();
+            }
+            
+            needsRefresh() {
+                return this.accessToken !== null
+                    && this.expiresAt - Date.now() < TokenManager.REFRESH_MARGIN_MS;
+            }
+            
+            checkAutoRefresh() {
+                if (document.visibilityState === 'visible' && !this.refreshing && this.needsRefresh()) {
                     this.refreshAccessToken();
-                }, refreshTime);
+                }
             }
             
             async refreshAccessToken() {
+                this.refreshing = true;
                 try {
                     const response = await fetch(`${API_BASE}/auth/refresh`, {
                         method: 'POST',
                         credentials: 'include' // 包含 cookies
                     });
                     
-                    if (response.ok) {
-                        const data = await response.json();
-                        if (data.success && data.data.access_token) {
-                            this.setAccessToken(data.data.access_token);
-                            console.log('🔄 Access token 自動重新整理成功');
-                        }
+                    const data = response.ok ? await response.json() : null;
+                    if (data && data.success && data.data && data.data.access_token) {
+                        this.setAccessToken(data.data.access_token);
+                        console.log('🔄 Access token 自動重新整理成功');
+                    } else {
+                        // refresh token 已過期或被撤銷：清除 access token，停止每分鐘重試
+                        console.warn('⚠️ 自動重新整理失敗，狀態碼:', response.status);
+                        this.clearSession();
                     }
                 } catch (error) {
                     console.error('❌ 自動重新整理失敗:', error);
-                    this.clearAccessToken();
+                    this.clearSession();
+                } finally {
+                    this.refreshing = false;
                 }
             }
         }
@@ -461,19 +397,47 @@ async def test_login_page():
         // API 基礎 URL
         const API_BASE = window.location.origin;
         
+        // 格式化後的 JSON 快取（以回應物件為鍵，物件不再使用時自動釋放）
+        const prettyJsonCache = new WeakMap();
+        
+        function prettyJson(data) {
+            if (data === null || typeof data !== 'object') {
+                return JSON.stringify(data, null, 2);
+            }
+            let text = prettyJsonCache.get(data);
+            if (text === undefined) {
+                text = JSON.stringify(data, null, 2);
+                prettyJsonCache.set(data, text);
+            }
+            return text;
+        }
+        
+        // 待寫入的回應區塊；同一畫格內的多次更新只保留最後一次，並於下一個畫格統一寫入 DOM
+        const pendingResponses = new Map();
+        
+        function flushResponses() {
+            for (const [element, { data, isError }] of pendingResponses) {
+                element.style.display = 'block';
+                element.className = isError ? 'response error' : 'response success';
+                element.textContent = prettyJson(data);
+            }
+            pendingResponses.clear();
+        }
+        
         // 顯示回應的通用函數
         function showResponse(elementId, data, isError = false) {
-            const element = document.getElementById(elementId);
-            element.style.display = 'block';
-            element.className = isError ? 'response error' : 'response success';
-            element.textContent = JSON.stringify(data, null, 2);
+            const element = els[elementId];
+            if (pendingResponses.size === 0) {
+                requestAnimationFrame(flushResponses);
+            }
+            pendingResponses.set(element, { data, isError });
         }
         
         // 註冊使用者
         async function registerUser() {
-            const email = document.getElementById('register-email').value;
-            const username = document.getElementById('register-username').value;
-            const password = document.getElementById('register-password').value;
+            const email = els['register-email'].value;
+            const username = els['register-username'].value;
+            const password = els['register-password'].value;
             
             if (!email || !username || !password) {
                 showResponse('register-response', { error: '請填寫所有欄位' }, true);
@@ -496,8 +460,8 @@ async def test_login_page():
         
         // 使用者登入
         async function loginUser() {
-            const email = document.getElementById('login-email').value;
-            const password = document.getElementById('login-password').value;
+            const email = els['login-email'].value;
+            const password = els['login-password'].value;
             
             if (!email || !password) {
                 showResponse('login-response', { error: '請填寫電子郵件和密碼' }, true);
@@ -519,10 +483,10 @@ async def test_login_page():
                     tokenManager.setAccessToken(data.data.access_token);
                     
                     // 顯示 tokens 和使用者資訊
-                    document.getElementById('login-tokens').style.display = 'block';
-                    document.getElementById('access-token-display').innerHTML = 
+                    els['login-tokens'].style.display = 'block';
+                    els['access-token-display'].innerHTML = 
                         `<strong>Access Token:</strong><br><div class="token-display">${data.data.access_token}</div>`;
-                    document.getElementById('refresh-token-display').innerHTML = 
+                    els['refresh-token-display'].innerHTML = 
                         `<strong>Refresh Token:</strong><br><div class="token-display">✅ 已存儲在 httpOnly Cookie 中</div>`;
                     
                     // 顯示使用者資訊
@@ -534,7 +498,7 @@ async def test_login_page():
                             <p><strong>使用者名稱:</strong> ${data.data.user.username}</p>
                             <p><strong>狀態:</strong> ${data.data.user.is_active ? '啟用' : '停用'}</p>
                         `;
-                        document.getElementById('login-tokens').innerHTML += `<div class="user-info">${userInfo}</div>`;
+                        els['login-tokens'].insertAdjacentHTML('beforeend', `<div class="user-info">${userInfo}</div>`);
                     }
                 }
                 
@@ -546,7 +510,7 @@ async def test_login_page():
         
         // OAuth 登入
         async function oauthLogin(provider) {
-            const token = document.getElementById('oauth-token').value;
+            const token = els['oauth-token'].value;
             
             if (!token) {
                 showResponse('oauth-response', { error: '請輸入 OAuth Token' }, true);
@@ -591,10 +555,10 @@ async def test_login_page():
                     tokenManager.setAccessToken(data.data.access_token);
                     
                     // 更新顯示
-                    document.getElementById('login-tokens').style.display = 'block';
-                    document.getElementById('access-token-display').innerHTML = 
+                    els['login-tokens'].style.display = 'block';
+                    els['access-token-display'].innerHTML = 
                         `<strong>新的 Access Token:</strong><br><div class="token-display">${data.data.access_token}</div>`;
-                    document.getElementById('refresh-token-display').innerHTML = 
+                    els['refresh-token-display'].innerHTML = 
                         `<strong>Refresh Token:</strong><br><div class="token-display">✅ 已更新並存儲在 httpOnly Cookie 中</div>`;
                 }
                 
@@ -611,7 +575,7 @@ async def test_login_page():
         
         // 取得當前使用者資訊
         async function getCurrentUser() {
-            const token = document.getElementById('user-token').value || tokenManager.getAccessToken();
+            const token = els['user-token'].value || tokenManager.getAccessToken();
             
             if (!token) {
                 showResponse('user-response', { error: '請先登入或輸入 Access Token' }, true);
@@ -626,8 +590,8 @@ async def test_login_page():
                 const data = await response.json();
                 
                 if (response.ok && data.success) {
-                    document.getElementById('user-info-display').style.display = 'block';
-                    document.getElementById('user-info-display').innerHTML = `
+                    els['user-info-display'].style.display = 'block';
+                    els['user-info-display'].innerHTML = `
                         <h4>使用者資訊：</h4>
                         <p><strong>ID:</strong> ${data.data.id}</p>
                         <p><strong>電子郵件:</strong> ${data.data.email}</p>
@@ -637,7 +601,7 @@ async def test_login_page():
                         <p><strong>更新時間:</strong> ${new Date(data.data.updated_at).toLocaleString('zh-TW')}</p>
                     `;
                 } else {
-                    document.getElementById('user-info-display').style.display = 'none';
+                    els['user-info-display'].style.display = 'none';
                 }
                 
                 showResponse('user-response', data, !response.ok || !data.success);
@@ -650,7 +614,7 @@ async def test_login_page():
         function useStoredAccessToken() {
             const token = tokenManager.getAccessToken();
             if (token) {
-                document.getElementById('user-token').value = token;
+                els['user-token'].value = token;
                 getCurrentUser();
             } else {
                 showResponse('user-response', { error: '沒有儲存的 Access Token，請先登入' }, true);
@@ -703,8 +667,8 @@ async def test_login_page():
                     tokenManager.clearAccessToken();
                     
                     // 清除顯示
-                    document.getElementById('login-tokens').style.display = 'none';
-                    document.getElementById('user-info-display').style.display = 'none';
+                    els['login-tokens'].style.display = 'none';
+                    els['user-info-display'].style.display = 'none';
                 }
                 
                 showResponse('logout-response', data, !response.ok || !data.success);
@@ -716,8 +680,8 @@ async def test_login_page():
         // 清除儲存的 Tokens
         function clearStoredTokens() {
             tokenManager.clearAccessToken();
-            document.getElementById('login-tokens').style.display = 'none';
-            document.getElementById('user-info-display').style.display = 'none';
+            els['login-tokens'].style.display = 'none';
+            els['user-info-display'].style.display = 'none';
             showResponse('logout-response', { 
                 success: true, 
                 message: '已清除本地 Access Token',
@@ -750,8 +714,8 @@ async def test_login_page():
         // 顯示當前 Token 狀態
         function showCurrentTokenStatus() {
             const accessToken = tokenManager.getAccessToken();
-            const statusElement = document.getElementById('token-status');
-            const contentElement = document.getElementById('token-status-content');
+            const statusElement = els['token-status'];
+            const contentElement = els['token-status-content'];
             
             statusElement.style.display = 'block';
             
@@ -995,15 +959,111 @@ async def test_login_page():
     </script>
 </body>
 </html>
+""".replace("__CSS_VERSION__", _CSS_VERSION).encode("utf-8")
+_TEST_LOGIN_HTML_GZ: bytes = gzip.compress(_TEST_LOGIN_HTML, compresslevel=9, mtime=0)
+_TEST_LOGIN_HTML_BR: Optional[bytes] = brotli.compress(_TEST_LOGIN_HTML, quality=11) if brotli else None
+
+# 測試登入頁面的快取標頭 - ETag 依內容於載入時計算，兩種編碼各自使用不同的強 ETag
+_TEST_LOGIN_ETAG = '"' + hashlib.blake2s(_TEST_LOGIN_HTML, digest_size=8).hexdigest() + '"'
+_TEST_LOGIN_ETAG_GZ = '"' + hashlib.blake2s(_TEST_LOGIN_HTML_GZ, digest_size=8).hexdigest() + '"'
+_TEST_LOGIN_HEADERS = {
+    "ETag": _TEST_LOGIN_ETAG,
+    "Cache-Control": "public, max-age=3600",
+    "Vary": "Accept-Encoding",
+}
+_TEST_LOGIN_HEADERS_GZ = {
+    **_TEST_LOGIN_HEADERS,
+    "ETag": _TEST_LOGIN_ETAG_GZ,
+    "Content-Encoding": "gzip",
+}
+# 304 回應不帶內容，因此不含 Content-Encoding
+_TEST_LOGIN_HEADERS_304_GZ = {k: v for k, v in _TEST_LOGIN_HEADERS_GZ.items() if k != "Content-Encoding"}
+if _TEST_LOGIN_HTML_BR is not None:
+    _TEST_LOGIN_ETAG_BR = '"' + hashlib.blake2s(_TEST_LOGIN_HTML_BR, digest_size=8).hexdigest() + '"'
+    _TEST_LOGIN_HEADERS_BR = {
+        **_TEST_LOGIN_HEADERS,
+        "ETag": _TEST_LOGIN_ETAG_BR,
+        "Content-Encoding": "br",
+    }
+    _TEST_LOGIN_HEADERS_304_BR = {k: v for k, v in _TEST_LOGIN_HEADERS_BR.items() if k != "Content-Encoding"}
+
+
+@lru_cache(maxsize=256)
+def _accepted_encodings(accept_encoding: str) -> FrozenSet[str]:
+    """
+    解析 Accept-Encoding 標頭，回傳用戶端接受的內容編碼（小寫）
+    
+    q=0 或 q 值無法解析的編碼視為拒絕；「*」代表未明確列出的 br 與 gzip 也可接受
+    用戶端送出的標頭種類有限，解析結果以 lru_cache 快取
+    """
+    accepted = set()
+    rejected = set()
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        (accepted if q > 0 else rejected).add(coding)
+    if "*" in accepted:
+        accepted.update(c for c in ("br", "gzip") if c not in rejected)
+    return frozenset(accepted - rejected - {"*"})
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    判斷 If-None-Match 是否與 ETag 相符
+    
+    標頭為逗號分隔的 ETag 清單或「*」；依 If-None-Match 規範採弱比較，忽略 W/ 前綴
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if (tag[2:] if tag.startswith("W/") else tag) == opaque:
+            return True
+    return False
+
+
+@app.get("/test-login", response_class=HTMLResponse, summary="測試登入頁面", include_in_schema=False)
+async def test_login_page(request: Request) -> Response:
     """
+    測試登入頁面，包含所有認證功能的測試界面
     
-    return HTMLResponse(content=html_content)
+    用戶端支援時回傳預先壓縮的 brotli 或 gzip 內容；If-None-Match 與 ETag 相符時回傳 304，不傳送內容
+    """
+    accept_encoding = _accepted_encodings(request.headers.get("accept-encoding", ""))
+    if _TEST_LOGIN_HTML_BR is not None and "br" in accept_encoding:
+        content, etag, headers, not_modified_headers = (
+            _TEST_LOGIN_HTML_BR, _TEST_LOGIN_ETAG_BR, _TEST_LOGIN_HEADERS_BR, _TEST_LOGIN_HEADERS_304_BR
+        )
+    elif "gzip" in accept_encoding:
+        content, etag, headers, not_modified_headers = (
+            _TEST_LOGIN_HTML_GZ, _TEST_LOGIN_ETAG_GZ, _TEST_LOGIN_HEADERS_GZ, _TEST_LOGIN_HEADERS_304_GZ
+        )
+    else:
+        content, etag, headers, not_modified_headers = (
+            _TEST_LOGIN_HTML, _TEST_LOGIN_ETAG, _TEST_LOGIN_HEADERS, _TEST_LOGIN_HEADERS
+        )
+    
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=not_modified_headers)
+    return HTMLResponse(content=content, headers=headers)
 
 
 @app.get("/", summary="根路徑")
 async def root():
     """API 根路徑，回傳服務狀態"""
-    from app.utils import ResponseHelper
     return ResponseHelper.success(
         message="FastAPI JWT Authentication Server",
         data={
@@ -1016,29 +1076,48 @@ async def root():
     )
 
 
+# 健康檢查快取 - 資料庫檢查成功後的數秒內不再重複查詢，限制外部探測對連接池的負擔
+_HEALTH_CACHE_SECONDS = 5
+_HEALTH_ETAG = 'W/"healthy-v1"'  # 弱 ETag：代表「健康」狀態，回應中的時間戳記不同仍視為相同
+_HEALTH_HEADERS = {
+    "ETag": _HEALTH_ETAG,
+    "Cache-Control": f"max-age={_HEALTH_CACHE_SECONDS}",
+}
+_health_checked_at = float("-inf")  # 最近一次資料庫檢查成功的 time.monotonic() 時間
+
+
 @app.get("/health", summary="健康檢查")
-async def health_check():
-    """服務健康檢查端點"""
-    from app.utils import ResponseHelper
+async def health_check(request: Request, response: Response):
+    """
+    服務健康檢查端點
+    
+    資料庫檢查成功的結果快取 _HEALTH_CACHE_SECONDS 秒；快取有效且 If-None-Match 相符時回傳 304
+    """
+    global _health_checked_at
     try:
-        # 測試資料庫連接
-        from app.database import DatabaseManager
-        with DatabaseManager.get_connection():
-            pass
+        now = time.monotonic()
+        if now - _health_checked_at >= _HEALTH_CACHE_SECONDS:
+            # 測試資料庫連接（連接可能來自連接池，因此實際執行查詢）
+            await run_in_threadpool(DatabaseManager.execute_scalar, "SELECT 1")
+            _health_checked_at = now
+            
+            if IS_DEV:
+                logger.debug("✅ 資料庫連接正常")
         
-        if os.getenv("ENVIRONMENT", "development") == "development":
-            logger.debug("✅ 資料庫連接正常")
+        if _etag_matches(request.headers.get("if-none-match"), _HEALTH_ETAG):
+            return Response(status_code=304, headers=_HEALTH_HEADERS)
         
+        response.headers.update(_HEALTH_HEADERS)
         return ResponseHelper.success(
             message="服務健康狀態良好",
             data={
                 "status": "healthy",
                 "database": "connected",
-                "timestamp": datetime.now().isoformat()
+                "timestamp": get_response_timestamp().isoformat()
             }
         )
     except Exception as e:
-        logger.error(f"❌ 健康檢查失敗: {str(e)}")
+        logger.error("❌ 健康檢查失敗: %s", e)
         return ResponseHelper.error(
             message="服務健康檢查失敗",
             error_code="HEALTH_CHECK_FAILED",
@@ -1051,14 +1130,6 @@ async def health_check():
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc: HTTPException):
     """HTTP 異常處理器 - 轉換為統一 API 格式"""
-    from app.utils import ResponseHelper
-    import json
-    
-    def json_serializer(obj):
-        """自定義 JSON 序列化器，處理 datetime 對象"""
-        if isinstance(obj, datetime):
-            return obj.isoformat()
-        raise TypeError(f"Object of type {type(obj)} is not JSON serializable")
     
     # 對於認證相關的錯誤，使用特殊處理
     if exc.status_code == 401:
@@ -1068,9 +1139,9 @@ async def http_exception_handler(request, exc: HTTPException):
             details={"detail": exc.detail},
             status_code=401
         )
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=401,
-            content=json.loads(error_response.json()),
+            content=error_response.model_dump(mode="json"),
             headers=exc.headers
         )
     elif exc.status_code == 403:
@@ -1080,9 +1151,9 @@ async def http_exception_handler(request, exc: HTTPException):
             details={"detail": exc.detail},
             status_code=403
         )
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=403,
-            content=json.loads(error_response.json())
+            content=error_response.model_dump(mode="json")
         )
     else:
         error_response = ResponseHelper.error(
@@ -1091,9 +1162,9 @@ async def http_exception_handler(request, exc: HTTPException):
             details={"detail": exc.detail},
             status_code=exc.status_code
         )
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=exc.status_code,
-            content=json.loads(error_response.json()),
+            content=error_response.model_dump(mode="json"),
             headers=exc.headers
         )
 
@@ -1101,11 +1172,9 @@ async def http_exception_handler(request, exc: HTTPException):
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
     """全域異常處理器"""
-    from app.utils import ResponseHelper
-    import json
     
-    if os.getenv("ENVIRONMENT", "development") == "development":
-        logger.error(f"未處理的異常: {str(exc)}", exc_info=True)
+    if IS_DEV:
+        logger.error("未處理的異常: %s", exc, exc_info=True)
         error_response = ResponseHelper.error(
             message="伺服器內部錯誤",
             error_code="INTERNAL_SERVER_ERROR",
@@ -1115,29 +1184,48 @@ async def global_exception_handler(request, exc):
             },
             status_code=500
         )
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=500,
-            content=json.loads(error_response.json())
+            content=error_response.model_dump(mode="json")
         )
     else:
-        logger.error(f"伺服器錯誤: {type(exc).__name__}")
+        logger.error("伺服器錯誤: %s", type(exc).__name__)
         error_response = ResponseHelper.error(
             message="伺服器內部錯誤",
             error_code="INTERNAL_SERVER_ERROR",
             status_code=500
         )
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=500,
-            content=json.loads(error_response.json())
+            content=error_response.model_dump(mode="json")
         )
 
 
 # 中間件：請求日誌記錄 (僅開發模式)
-if os.getenv("ENVIRONMENT", "development") == "development":
+if IS_DEV:
     @app.middleware("http")
     async def log_requests(request, call_next):
         """記錄 HTTP 請求 (開發模式)"""
-        logger.debug(f"📥 {request.method} {request.url}")
+        logger.debug("📥 %s %s", request.method, request.url)
         response = await call_next(request)
-        logger.debug(f"📤 回應狀態: {response.status_code}")
-        return response 
\ No newline at end of file
+        logger.debug("📤 回應狀態: %s", response.status_code)
+        return response 
+
+
+if __name__ == "__main__":
+    import uvicorn
+    
+    # uvloop / asyncio 交由 uvicorn 在每個 worker 與 reload 子程序中設定；
+    # uringcore 的 policy 只安裝在目前程序（uvicorn 不再覆寫），子程序使用 asyncio 預設迴圈
+    # 使用 httptools HTTP 解析器，開發模式啟用自動重新載入
+    event_loop = _install_event_loop_policy()
+    uvicorn.run(
+        "app.main:app",
+        host="0.0.0.0",
+        port=8000,
+        reload=IS_DEV,
+        workers=None if IS_DEV else (os.cpu_count() or 1),
+        loop="none" if event_loop == "uringcore" else event_loop,
+        http="httptools",
+        log_level="debug" if IS_DEV else "info"
+    )
@@ -10,8 +10,13 @@ Pydantic 模型定義
 使用 Pydantic 提供資料驗證、序列化和文件生成功能
 """
 from datetime import datetime
-from typing import Optional, Any, Dict, List, Union
-from pydantic import BaseModel, EmailStr
+from typing import Annotated, Optional, Any, Dict
+from pydantic import BaseModel, ConfigDict, EmailStr, StringConstraints
+
+
+# 輕量電子郵件格式 - 僅以預先編譯的正規表示式檢查基本結構
+# 用於 OAuth 提供者回傳的電子郵件（已由提供者驗證），省去 email-validator 的完整驗證流程
+EmailFast = Annotated[str, StringConstraints(pattern=r"^[^@\s]+@[^@\s]+\.[^@\s]+$", max_length=254)]
 
 
 class UserBase(BaseModel):
@@ -46,9 +51,7 @@ class UserResponse(UserBase):
     created_at: datetime  # 建立時間
     updated_at: datetime  # 更新時間
 
-    class Config:
-        """Pydantic 配置"""
-        from_attributes = True  # 允許從 ORM 物件建立
+    model_config = ConfigDict(from_attributes=True)  # 允許從 ORM 物件建立
 
 
 class UserLogin(BaseModel):
@@ -102,7 +105,7 @@ class OAuthUser(BaseModel):
     用於儲存從 OAuth 提供者取得的使用者資訊
     支援 Google、Facebook、GitHub 等提供者
     """
-    email: EmailStr  # 電子郵件地址
+    email: EmailFast  # 電子郵件地址（由 OAuth 提供者驗證）
     username: str    # 使用者名稱
     provider: str    # OAuth 提供者名稱（google、facebook、github）
     provider_id: str # OAuth 提供者的使用者唯一識別碼
@@ -123,14 +126,8 @@ class ApiResponse(BaseModel):
     success: bool  # 操作是否成功
     status_code: int  # HTTP 狀態碼
     message: str  # 回應訊息
-    data: Optional[Union[Dict[str, Any], List[Any], Any]] = None  # 回應資料
-    timestamp: datetime  # 回應時間戳記
-    
-    class Config:
-        """Pydantic 配置"""
-        json_encoders = {
-            datetime: lambda v: v.isoformat()  # 將 datetime 轉換為 ISO 格式字串
-        }
+    data: Any = None  # 回應資料（由伺服器端建立，宣告為 Any 直接沿用原物件，不逐一驗證與複製內容）
+    timestamp: datetime  # 回應時間戳記（pydantic-core 原生序列化為 ISO 8601 字串，不需自訂 json_encoders）
 
 
 class ApiSuccessResponse(ApiResponse):
@@ -10,57 +10,43 @@ OAuth 整合模組
 
 支援多種主流 OAuth 提供者，提供統一的認證介面
 """
-from typing import Dict, Any, Optional
-from authlib.integrations.starlette_client import OAuth
+from typing import Awaitable, Callable, Dict, Any, Optional
 from starlette.requests import Request
 from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+import asyncio
+import hashlib
 import httpx
 
 from app.config import settings
 from app.database import UserRepository
 from app.auth import AuthService
 from app.models import OAuthUser
+from app.utils import TTLCache, get_utc_now
 
 
-# OAuth 客戶端配置
-oauth = OAuth()
+# 共用的 HTTP 客戶端 - 重用與各 OAuth 提供者之間的連線，避免每次登入都重新進行 DNS 查詢與 TLS 交握；
+# 啟用 HTTP/2，同一提供者的並行請求（例如 GitHub 的使用者與電子郵件 API）在單一連線上多工傳輸
+_http_client: Optional[httpx.AsyncClient] = None
 
-# 根據環境變數註冊 OAuth 提供者
-if settings.GOOGLE_CLIENT_ID and settings.GOOGLE_CLIENT_SECRET:
-    """註冊 Google OAuth 客戶端"""
-    oauth.register(
-        name='google',
-        client_id=settings.GOOGLE_CLIENT_ID,
-        client_secret=settings.GOOGLE_CLIENT_SECRET,
-        server_metadata_url='https://accounts.google.com/.well-known/openid_configuration',
-        client_kwargs={
-            'scope': 'openid email profile'  # 請求的權限範圍
-        }
-    )
 
-if settings.FACEBOOK_CLIENT_ID and settings.FACEBOOK_CLIENT_SECRET:
-    """註冊 Facebook OAuth 客戶端"""
-    oauth.register(
-        name='facebook',
-        client_id=settings.FACEBOOK_CLIENT_ID,
-        client_secret=settings.FACEBOOK_CLIENT_SECRET,
-        access_token_url='https://graph.facebook.com/oauth/access_token',
-        authorize_url='https://www.facebook.com/dialog/oauth',
-        api_base_url='https://graph.facebook.com/',
-        client_kwargs={'scope': 'email'},  # 只請求電子郵件權限
-    )
+def _get_http_client() -> httpx.AsyncClient:
+    """取得共用的 HTTP 客戶端，尚未建立或已關閉時建立新的客戶端"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            http2=True,
+            timeout=5.0,
+            limits=httpx.Limits(max_keepalive_connections=64, max_connections=128)
+        )
+    return _http_client
+
 
-if settings.GITHUB_CLIENT_ID and settings.GITHUB_CLIENT_SECRET:
-    """註冊 GitHub OAuth 客戶端"""
-    oauth.register(
-        name='github',
-        client_id=settings.GITHUB_CLIENT_ID,
-        client_secret=settings.GITHUB_CLIENT_SECRET,
-        access_token_url='https://github.com/login/oauth/access_token',
-        authorize_url='https://github.com/login/oauth/authorize',
-        api_base_url='https://api.github.com/',
-        client_kwargs={'scope': 'user:email'},  # 請求使用者和電子郵件權限
-    )
+# OAuth 使用者資訊快取 - 以 (提供者, Token 的 SHA-256 摘要) 為鍵，同一 Token 重複登入時不需再次呼叫提供者 API
+_userinfo_cache = TTLCache(
+    maxsize=settings.OAUTH_USERINFO_CACHE_MAX_SIZE,
+    ttl=settings.OAUTH_USERINFO_CACHE_TTL_SECONDS
+)
 
 
 class OAuthService:
@@ -73,6 +59,19 @@ class OAuthService:
     - 使用者帳戶建立/連結
     """
     
+    @staticmethod
+    async def close_http_client():
+        """
+        關閉共用的 HTTP 客戶端及其連線
+        
+        Note:
+            於應用程式關閉時呼叫
+        """
+        global _http_client
+        if _http_client is not None:
+            await _http_client.aclose()
+            _http_client = None
+    
     @staticmethod
     async def get_google_user_info(token: str) -> Optional[OAuthUser]:
         """
@@ -88,19 +87,18 @@ class OAuthService:
             使用 Google UserInfo API v2 取得基本使用者資訊
         """
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    'https://www.googleapis.com/oauth2/v2/userinfo',
-                    headers={'Authorization': f'Bearer {token}'}
+            response = await _get_http_client().get(
+                'https://www.googleapis.com/oauth2/v2/userinfo',
+                headers={'Authorization': f'Bearer {token}'}
+            )
+            if response.status_code == 200:
+                user_data = response.json()
+                return OAuthUser(
+                    email=user_data.get('email'),
+                    username=user_data.get('name') or (user_data.get('email') or '').partition('@')[0],
+                    provider='google',
+                    provider_id=user_data.get('id')
                 )
-                if response.status_code == 200:
-                    user_data = response.json()
-                    return OAuthUser(
-                        email=user_data.get('email'),
-                        username=user_data.get('name', user_data.get('email').split('@')[0]),
-                        provider='google',
-                        provider_id=user_data.get('id')
-                    )
         except Exception:
             # 發生任何錯誤時回傳 None，讓呼叫方處理
             pass
@@ -121,22 +119,21 @@ class OAuthService:
             使用 Facebook Graph API 取得 id、name、email 欄位
         """
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    'https://graph.facebook.com/me',
-                    params={
-                        'fields': 'id,name,email',  # 指定需要的欄位
-                        'access_token': token
-                    }
+            response = await _get_http_client().get(
+                'https://graph.facebook.com/me',
+                params={
+                    'fields': 'id,name,email',  # 指定需要的欄位
+                    'access_token': token
+                }
+            )
+            if response.status_code == 200:
+                user_data = response.json()
+                return OAuthUser(
+                    email=user_data.get('email'),
+                    username=user_data.get('name') or (user_data.get('email') or '').partition('@')[0],
+                    provider='facebook',
+                    provider_id=user_data.get('id')
                 )
-                if response.status_code == 200:
-                    user_data = response.json()
-                    return OAuthUser(
-                        email=user_data.get('email'),
-                        username=user_data.get('name', user_data.get('email', '').split('@')[0]),
-                        provider='facebook',
-                        provider_id=user_data.get('id')
-                    )
         except Exception:
             # 發生任何錯誤時回傳 None
             pass
@@ -156,40 +153,36 @@ class OAuthService:
         Note:
             需要分別呼叫使用者 API 和電子郵件 API
             GitHub 的電子郵件可能不在基本使用者資訊中
+            兩個請求互不相依，因此同時發出，只需等待一次往返時間
         """
         try:
-            async with httpx.AsyncClient() as client:
-                # 取得使用者基本資訊
-                user_response = await client.get(
-                    'https://api.github.com/user',
-                    headers={'Authorization': f'token {token}'}
-                )
+            client = _get_http_client()
+            headers = {'Authorization': f'token {token}'}
+            # 同時取得使用者基本資訊與電子郵件列表
+            user_response, email_response = await asyncio.gather(
+                client.get('https://api.github.com/user', headers=headers),
+                client.get('https://api.github.com/user/emails', headers=headers)
+            )
+            
+            if user_response.status_code == 200:
+                user_data = user_response.json()
+                
+                # 先嘗試從使用者資料中取得公開電子郵件
+                email = user_data.get('email')
+                
+                # 如果沒有公開電子郵件，從電子郵件列表中取得主要電子郵件
+                if not email and email_response.status_code == 200:
+                    emails = email_response.json()
+                    primary_email = next((e for e in emails if e.get('primary')), None)
+                    email = primary_email.get('email') if primary_email else None
                 
-                if user_response.status_code == 200:
-                    user_data = user_response.json()
-                    
-                    # 取得使用者電子郵件列表
-                    email_response = await client.get(
-                        'https://api.github.com/user/emails',
-                        headers={'Authorization': f'token {token}'}
+                if email:
+                    return OAuthUser(
+                        email=email,
+                        username=user_data.get('login') or email.partition('@')[0],
+                        provider='github',
+                        provider_id=str(user_data.get('id'))  # GitHub ID 是數字，轉為字串
                     )
-                    
-                    # 先嘗試從使用者資料中取得公開電子郵件
-                    email = user_data.get('email')
-                    
-                    # 如果沒有公開電子郵件，從電子郵件列表中取得主要電子郵件
-                    if not email and email_response.status_code == 200:
-                        emails = email_response.json()
-                        primary_email = next((e for e in emails if e.get('primary')), None)
-                        email = primary_email.get('email') if primary_email else None
-                    
-                    if email:
-                        return OAuthUser(
-                            email=email,
-                            username=user_data.get('login', email.split('@')[0]),
-                            provider='github',
-                            provider_id=str(user_data.get('id'))  # GitHub ID 是數字，轉為字串
-                        )
         except Exception:
             # 發生任何錯誤時回傳 None
             pass
@@ -209,70 +202,54 @@ class OAuthService:
             
         Flow:
             1. 根據提供者取得使用者資訊
-            2. 檢查使用者是否已存在
-            3. 如果不存在則建立新使用者
-            4. 更新登入時間
-            5. 產生 JWT Token
+            2. 以單一批次查找使用者、不存在則建立，並更新登入時間
+            3. 產生 JWT Token
             
         Note:
             如果相同電子郵件已存在但使用不同登入方式，目前不會自動連結帳戶
         """
-        # 根據不同的 OAuth 提供者取得使用者資訊
-        oauth_user = None
-        if provider == 'google':
-            oauth_user = await OAuthService.get_google_user_info(token)
-        elif provider == 'facebook':
-            oauth_user = await OAuthService.get_facebook_user_info(token)
-        elif provider == 'github':
-            oauth_user = await OAuthService.get_github_user_info(token)
+        fetch_user_info = _PROVIDER_FETCHERS.get(provider)
+        if fetch_user_info is None:
+            return None
+        
+        # 根據不同的 OAuth 提供者取得使用者資訊（優先使用快取，查詢失敗的結果不會被快取）
+        cache_key = (provider, hashlib.sha256(token.encode()).digest())
+        oauth_user = _userinfo_cache.get(cache_key)
+        if oauth_user is None:
+            oauth_user = await fetch_user_info(token)
+            if oauth_user is not None:
+                _userinfo_cache.set(cache_key, oauth_user)
         
         # 如果無法取得使用者資訊或電子郵件為空，則登入失敗
         if not oauth_user or not oauth_user.email:
             return None
         
-        # 檢查是否已有相同 OAuth 提供者的使用者
-        existing_user = UserRepository.get_user_by_provider(provider, oauth_user.provider_id)
-        
-        if not existing_user:
-            # 檢查是否有相同電子郵件的使用者（可能是其他登入方式）
-            email_user = UserRepository.get_user_by_email(oauth_user.email)
-            if email_user:
-                # 如果有相同電子郵件的使用者，目前不自動連結帳戶
-                # 這裡可以根據業務需求決定是否允許帳戶連結
-                return None
-            
-            # 建立新的 OAuth 使用者
-            success = UserRepository.create_user(
-                email=oauth_user.email,
-                username=oauth_user.username,
-                password_hash='',  # OAuth 使用者沒有密碼
-                provider=provider,
-                provider_id=oauth_user.provider_id
-            )
-            
-            if not success:
-                return None
-                
-            # 重新取得新建立的使用者資訊
-            user = UserRepository.get_user_by_email(oauth_user.email)
-        else:
-            # 使用現有的使用者
-            user = existing_user
-        
+        # 查找或建立使用者並更新最後登入時間（單一資料庫往返；同一時間點也用於 refresh token 的建立時間與過期時間計算）
+        # 如果有相同電子郵件的使用者（其他登入方式），目前不自動連結帳戶，登入失敗
+        now = get_utc_now()
+        user = await run_in_threadpool(
+            UserRepository.upsert_oauth_user,
+            provider, oauth_user.provider_id, oauth_user.email, oauth_user.username, now
+        )
         if not user:
             return None
         
-        # 更新最後登入時間
-        UserRepository.update_user_login_time(user["id"])
-        
         # 建立 JWT Token
         access_token = AuthService.create_access_token(
             data={"sub": user["id"], "email": user["email"]}
         )
-        refresh_token = AuthService.create_refresh_token(user["id"])
+        refresh_token = await run_in_threadpool(AuthService.create_refresh_token, user["id"], now)
         
         return {
             "access_token": access_token,
             "refresh_token": refresh_token,
             "token_type": "bearer"
-        } 
\ No newline at end of file
+        }
+
+
+# 各 OAuth 提供者取得使用者資訊的函式 - 新增提供者時於此註冊
+_PROVIDER_FETCHERS: Dict[str, Callable[[str], Awaitable[Optional[OAuthUser]]]] = {
+    'google': OAuthService.get_google_user_info,
+    'facebook': OAuthService.get_facebook_user_info,
+    'github': OAuthService.get_github_user_info,
+}
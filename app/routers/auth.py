@@ -3,6 +3,7 @@
 """
 from fastapi import APIRouter, HTTPException, status, Depends, Response, Request
 from fastapi.security import HTTPAuthorizationCredentials
+from fastapi.concurrency import run_in_threadpool
 from typing import Dict, Any
 import logging
 
@@ -10,16 +11,59 @@ from app.models import (
     UserLogin, UserCreate, UserResponse, Token, RefreshTokenRequest,
     ApiSuccessResponse, ApiErrorResponse
 )
-from app.auth import AuthService, get_current_active_user, security
-from app.database import UserRepository
+from app.auth import AuthService, bearer_token, get_current_active_user, security
+from app.database import RefreshTokenRepository, UserRepository
 from app.oauth import OAuthService
-from app.utils import ResponseHelper
+from app.utils import ACCESS_TOKEN_EXPIRES_IN, ResponseHelper, get_utc_now, iso_taiwan
 from app.config import settings
-import hashlib
 
 router = APIRouter(prefix="/auth", tags=["認證"])
 logger = logging.getLogger(__name__)
 
+# 支援的 OAuth 提供者
+_ALLOWED_PROVIDERS = frozenset({"google", "facebook", "github"})
+
+# 固定內容錯誤的參數 - 於載入時建立一次，每次拋出時建立新的 HTTPException，
+# 避免共用的例外物件在請求間保留 traceback（含請求資料）並被並行請求同時修改
+_INVALID_CREDENTIALS_KW = {
+    "status_code": status.HTTP_401_UNAUTHORIZED,
+    "detail": "Incorrect email or password",
+    "headers": {"WWW-Authenticate": "Bearer"},
+}
+_NO_REFRESH_KW = {
+    "status_code": status.HTTP_401_UNAUTHORIZED,
+    "detail": "Refresh token not found in cookies",
+}
+_INVALID_REFRESH_KW = {
+    "status_code": status.HTTP_401_UNAUTHORIZED,
+    "detail": "Invalid refresh token",
+}
+_UNSUPPORTED_PROVIDER_KW = {
+    "status_code": status.HTTP_400_BAD_REQUEST,
+    "detail": "Unsupported OAuth provider",
+}
+_OAUTH_FAILED_KW = {
+    "status_code": status.HTTP_401_UNAUTHORIZED,
+    "detail": "OAuth authentication failed",
+}
+
+# refresh token Cookie 有效秒數
+_REFRESH_MAX_AGE = settings.REFRESH_TOKEN_EXPIRE_DAYS * 24 * 60 * 60
+
+# refresh token Cookie 的 Set-Cookie 標頭 - 屬性固定，於載入時預先組成，每次只需代入 Token
+# （Token 為 Base64URL 字元，不需跳脫）；secure 於開發環境為 False，生產環境應加上 Secure
+_REFRESH_COOKIE_PREFIX = b"refresh_token="
+_REFRESH_COOKIE_SUFFIX = (
+    f"; HttpOnly; Max-Age={_REFRESH_MAX_AGE}; Path=/; SameSite=lax"
+).encode("latin-1")
+
+
+def _set_refresh_cookie(response: Response, refresh_token: str):
+    """以預先組成的 Set-Cookie 標頭設定 refresh token Cookie"""
+    response.raw_headers.append(
+        (b"set-cookie", _REFRESH_COOKIE_PREFIX + refresh_token.encode("latin-1") + _REFRESH_COOKIE_SUFFIX)
+    )
+
 
 @router.post("/register", response_model=ApiSuccessResponse, summary="註冊新使用者")
 async def register(user_data: UserCreate):
@@ -32,7 +76,7 @@ async def register(user_data: UserCreate):
     """
     try:
         # 檢查使用者是否已存在
-        existing_user = UserRepository.get_user_by_email(user_data.email)
+        existing_user = await run_in_threadpool(UserRepository.get_user_by_email, user_data.email)
         if existing_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -40,15 +84,16 @@ async def register(user_data: UserCreate):
             )
         
         # 建立新使用者
-        password_hash = AuthService.get_password_hash(user_data.password)
-        success = UserRepository.create_user(
+        password_hash = await AuthService.get_password_hash(user_data.password)
+        success = await run_in_threadpool(
+            UserRepository.create_user,
             email=user_data.email,
             username=user_data.username,
             password_hash=password_hash
         )
         
         if not success:
-            logger.error(f"建立使用者失敗 (email: {user_data.email})")
+            logger.error("建立使用者失敗 (email: %s)", user_data.email)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to create user."
@@ -58,7 +103,7 @@ async def register(user_data: UserCreate):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"註冊時發生未預期錯誤 (email: {user_data.email}): {e}", exc_info=True)
+        logger.error("註冊時發生未預期錯誤 (email: %s): %s", user_data.email, e, exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An unexpected error occurred during registration."
@@ -75,41 +120,28 @@ async def login(user_credentials: UserLogin, response: Response):
     
     回傳 JWT access token，refresh token 透過 httpOnly cookie 設定
     """
-    user = AuthService.authenticate_user(user_credentials.email, user_credentials.password)
+    user = await AuthService.authenticate_user(user_credentials.email, user_credentials.password)
     if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect email or password",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    # 更新登入時間
-    UserRepository.update_user_login_time(user["id"])
+        raise HTTPException(**_INVALID_CREDENTIALS_KW)
     
-    # 建立 Token
+    # 建立 Token；refresh token 寫入與登入時間更新在同一次資料庫往返中完成
+    # （同一時間點同時用於最後登入時間、refresh token 的建立時間與過期時間計算）
+    now = get_utc_now()
     access_token = AuthService.create_access_token(
         data={"sub": user["id"], "email": user["email"]}
     )
-    refresh_token = AuthService.create_refresh_token(user["id"])
+    refresh_token = await run_in_threadpool(AuthService.create_refresh_token, user["id"], now, record_login=True)
     
     # 設定 httpOnly cookie for refresh token
-    response.set_cookie(
-        key="refresh_token",
-        value=refresh_token,
-        httponly=True,
-        secure=False,  # 開發環境設為 False，生產環境應為 True
-        samesite="lax",
-        max_age=settings.REFRESH_TOKEN_EXPIRE_DAYS * 24 * 60 * 60  # 7天
-    )
+    _set_refresh_cookie(response, refresh_token)
     
     # 準備使用者資訊 (排除敏感資料)，轉換為台灣時間顯示
-    from app.utils import to_taiwan_time
     user_info = {
         "id": user["id"],
         "email": user["email"],
         "username": user["username"],
         "is_active": user["is_active"],
-        "created_at": to_taiwan_time(user["created_at"]).isoformat() if user.get("created_at") else None
+        "created_at": iso_taiwan(user["created_at"]) if user.get("created_at") else None
     }
     
     return ResponseHelper.login_success(access_token, user_info)
@@ -125,28 +157,15 @@ async def refresh_token(request: Request, response: Response):
     # 從 cookie 讀取 refresh token
     refresh_token = request.cookies.get("refresh_token")
     if not refresh_token:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Refresh token not found in cookies"
-        )
+        raise HTTPException(**_NO_REFRESH_KW)
     
-    token_data = AuthService.refresh_access_token(refresh_token, rotate_refresh_token=True)
+    token_data = await AuthService.refresh_access_token_coalesced(refresh_token)
     if not token_data:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid refresh token"
-        )
+        raise HTTPException(**_INVALID_REFRESH_KW)
     
     # 如果有新的 refresh token，更新 cookie
     if "refresh_token" in token_data:
-        response.set_cookie(
-            key="refresh_token",
-            value=token_data["refresh_token"],
-            httponly=True,
-            secure=False,  # 開發環境設為 False，生產環境應為 True
-            samesite="lax",
-            max_age=settings.REFRESH_TOKEN_EXPIRE_DAYS * 24 * 60 * 60  # 7天
-        )
+        _set_refresh_cookie(response, token_data["refresh_token"])
     
     return ResponseHelper.token_refresh_success(token_data["access_token"])
 
@@ -159,37 +178,24 @@ async def oauth_login(provider: str, response: Response, credentials: HTTPAuthor
     - **provider**: OAuth 提供者 (google, facebook, github)
     - **Authorization**: Bearer token (OAuth access token)
     """
-    if provider not in ["google", "facebook", "github"]:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Unsupported OAuth provider"
-        )
+    if provider not in _ALLOWED_PROVIDERS:
+        raise HTTPException(**_UNSUPPORTED_PROVIDER_KW)
     
     # 處理 OAuth 登入
     token_data = await OAuthService.process_oauth_login(provider, credentials.credentials)
     if not token_data:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="OAuth authentication failed"
-        )
+        raise HTTPException(**_OAUTH_FAILED_KW)
     
     # 設定 httpOnly cookie for refresh token
     if "refresh_token" in token_data:
-        response.set_cookie(
-            key="refresh_token",
-            value=token_data["refresh_token"],
-            httponly=True,
-            secure=False,
-            samesite="lax",
-            max_age=settings.REFRESH_TOKEN_EXPIRE_DAYS * 24 * 60 * 60
-        )
+        _set_refresh_cookie(response, token_data["refresh_token"])
     
     return ResponseHelper.success(
         message="OAuth 登入成功",
         data={
             "access_token": token_data["access_token"],
             "token_type": token_data.get("token_type", "bearer"),
-            "expires_in": 30 * 60
+            "expires_in": ACCESS_TOKEN_EXPIRES_IN
         },
         status_code=200
     )
@@ -202,7 +208,6 @@ async def get_current_user_info(current_user: Dict[str, Any] = Depends(get_curre
     
     需要有效的 JWT token
     """
-    from app.utils import to_taiwan_time
     
     # 準備使用者資訊 (排除敏感資料)，轉換為台灣時間顯示
     user_data = {
@@ -210,9 +215,9 @@ async def get_current_user_info(current_user: Dict[str, Any] = Depends(get_curre
         "email": current_user["email"],
         "username": current_user["username"],
         "is_active": current_user["is_active"],
-        "created_at": to_taiwan_time(current_user["created_at"]).isoformat() if current_user.get("created_at") else None,
-        "updated_at": to_taiwan_time(current_user["updated_at"]).isoformat() if current_user.get("updated_at") else None,
-        "last_login": to_taiwan_time(current_user["last_login"]).isoformat() if current_user.get("last_login") else None
+        "created_at": iso_taiwan(current_user["created_at"]) if current_user.get("created_at") else None,
+        "updated_at": iso_taiwan(current_user["updated_at"]) if current_user.get("updated_at") else None,
+        "last_login": iso_taiwan(current_user["last_login"]) if current_user.get("last_login") else None
     }
     
     return ResponseHelper.success(
@@ -226,19 +231,22 @@ async def get_current_user_info(current_user: Dict[str, Any] = Depends(get_curre
 async def logout(
     request: Request,
     response: Response,
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+    current_user: Dict[str, Any] = Depends(get_current_active_user),
+    access_token: str = Depends(bearer_token)
 ):
     """
     使用者登出，撤銷 refresh token
     
-    從 httpOnly cookie 讀取並撤銷 refresh token
+    從 httpOnly cookie 讀取並撤銷 refresh token，並移除 access token 的驗證快取
     """
+    AuthService.invalidate_access_token(access_token)
+    
     # 從 cookie 讀取 refresh token
     refresh_token = request.cookies.get("refresh_token")
     if refresh_token:
-        token_hash = hashlib.sha256(refresh_token.encode()).hexdigest()
-        from app.database import RefreshTokenRepository
-        RefreshTokenRepository.revoke_refresh_token(token_hash)
+        token_hash = AuthService.hash_refresh_token(refresh_token)
+        if token_hash is not None:
+            await run_in_threadpool(RefreshTokenRepository.revoke_refresh_token, token_hash)
     
     # 清除 refresh token cookie
     response.delete_cookie(
@@ -252,21 +260,15 @@ async def logout(
 
 
 @router.get("/debug-token", response_model=ApiSuccessResponse, summary="調試 Token")
-async def debug_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def debug_token(token: str = Depends(bearer_token)):
     """
     調試 Token 驗證問題
     
-    需要有效的 JWT token
+    需要有效的 JWT token；Token 只解碼一次（已驗證的 Token 取自快取），再由 verify_payload 檢查內容
     """
     try:
-        token = credentials.credentials
-        
-        # 先驗證 token 本身
-        from jose import jwt
-        from app.config import settings
-        
         try:
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+            payload = AuthService.decode_token(token)
         except Exception as jwt_error:
             return ResponseHelper.error(
                 message="JWT 解碼失敗",
@@ -276,7 +278,7 @@ async def debug_token(credentials: HTTPAuthorizationCredentials = Depends(securi
             )
         
         # 檢查 token 內容
-        token_data = AuthService.verify_token(token)
+        token_data = AuthService.verify_payload(payload)
         if token_data is None:
             return ResponseHelper.error(
                 message="Token 驗證失敗",
@@ -286,7 +288,9 @@ async def debug_token(credentials: HTTPAuthorizationCredentials = Depends(securi
             )
         
         # 檢查使用者
-        user = UserRepository.get_user_by_id(token_data.user_id)
+        user = UserRepository.get_cached_user_by_id(token_data.user_id)
+        if user is None:
+            user = await run_in_threadpool(UserRepository.get_user_by_id, token_data.user_id)
         if user is None:
             return ResponseHelper.error(
                 message="使用者不存在",
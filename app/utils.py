@@ -1,8 +1,12 @@
 """
 工具函數和輔助類別
 """
-from typing import Any, Optional, Dict, List, Union
+from typing import Any, Optional, Dict, List, Union, Hashable, Tuple
 from datetime import datetime, timezone, timedelta
+from collections import OrderedDict
+from functools import lru_cache
+import threading
+import time
 try:
     # 嘗試使用 zoneinfo (Python 3.9+)
     from zoneinfo import ZoneInfo
@@ -12,8 +16,12 @@ except (ImportError, Exception):
     # 這對於台灣是準確的，因為台灣不使用夏令時間
     TAIWAN_TZ = timezone(timedelta(hours=8))
 
+from app.config import settings
 from app.models import ApiSuccessResponse, ApiErrorResponse
 
+# 存取 Token 有效秒數 - 回應中的 expires_in，依設定於載入時計算
+ACCESS_TOKEN_EXPIRES_IN = settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+
 # 時間處理函數 - 使用標準庫方法
 def get_taiwan_now() -> datetime:
     """取得當前台灣時間"""
@@ -23,20 +31,100 @@ def get_utc_now() -> datetime:
     """取得當前 UTC 時間"""
     return datetime.now(timezone.utc)
 
+# 回應時間戳記快取 - (Unix 秒數, 該秒的台灣時間)；tuple 整體替換，多執行緒讀取不需加鎖
+_response_timestamp: Tuple[int, datetime] = (0, datetime.fromtimestamp(0, TAIWAN_TZ))
+
+def get_response_timestamp() -> datetime:
+    """
+    取得 API 回應使用的台灣時間（秒級精度）
+    
+    同一秒內的回應共用同一個 datetime 物件，只在秒數改變時重新建立
+    """
+    global _response_timestamp
+    second = int(time.time())
+    cached_second, timestamp = _response_timestamp
+    if second != cached_second:
+        timestamp = datetime.fromtimestamp(second, TAIWAN_TZ)
+        _response_timestamp = (second, timestamp)
+    return timestamp
+
 def to_taiwan_time(dt: datetime) -> datetime:
     """將時間轉換為台灣時間"""
+    if dt.tzinfo is TAIWAN_TZ:
+        return dt
     if dt.tzinfo is None:
         # 如果是 naive datetime，假設為 UTC
         dt = dt.replace(tzinfo=timezone.utc)
     return dt.astimezone(TAIWAN_TZ)
 
+@lru_cache(maxsize=8192)
+def iso_taiwan(dt: datetime) -> str:
+    """
+    將時間轉換為台灣時間的 ISO 8601 字串
+    
+    使用者的建立、更新與登入時間很少變動，結果依 datetime 快取，避免每次回應重複轉換時區與格式化
+    """
+    return to_taiwan_time(dt).isoformat()
+
 def to_utc_time(dt: datetime) -> datetime:
     """將時間轉換為 UTC 時間"""
+    if dt.tzinfo is timezone.utc:
+        return dt
     if dt.tzinfo is None:
         # 如果是 naive datetime，假設為台灣時間
         dt = dt.replace(tzinfo=TAIWAN_TZ)
     return dt.astimezone(timezone.utc)
 
+class TTLCache:
+    """
+    具有存活時間 (TTL) 的執行緒安全 LRU 快取
+
+    每筆資料可指定自己的到期時間（Unix 時間戳記），實際到期時間取其與預設 TTL 的較小值；
+    超過 maxsize 時淘汰最久未使用的資料
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """取得未過期的快取值，不存在或已過期則回傳 default"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, expires_at: Optional[float] = None):
+        """寫入快取值，expires_at 為資料本身的到期時間（例如 JWT 的 exp）"""
+        deadline = time.time() + self.ttl
+        if expires_at is not None:
+            deadline = min(deadline, expires_at)
+        with self._lock:
+            self._data[key] = (value, deadline)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """移除並回傳快取值"""
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return entry[0] if entry is not None else default
+
+    def clear(self):
+        """清除所有快取"""
+        with self._lock:
+            self._data.clear()
+
+
 class ResponseHelper:
     """API 回應格式輔助類別"""
     
@@ -51,7 +139,7 @@ class ResponseHelper:
             message=message,
             data=data,
             status_code=status_code,
-            timestamp=get_taiwan_now()
+            timestamp=get_response_timestamp()
         )
     
     @staticmethod
@@ -67,7 +155,7 @@ class ResponseHelper:
             error_code=error_code,
             details=details,
             status_code=status_code,
-            timestamp=get_taiwan_now()
+            timestamp=get_response_timestamp()
         )
     
     @staticmethod
@@ -79,7 +167,7 @@ class ResponseHelper:
                 "access_token": access_token,
                 "token_type": "bearer",
                 "user": user_info,
-                "expires_in": 30 * 60  # 30 分鐘，以秒為單位
+                "expires_in": ACCESS_TOKEN_EXPIRES_IN
             },
             status_code=200
         )
@@ -109,7 +197,7 @@ class ResponseHelper:
             data={
                 "access_token": access_token,
                 "token_type": "bearer",
-                "expires_in": 30 * 60  # 30 分鐘
+                "expires_in": ACCESS_TOKEN_EXPIRES_IN
             },
             status_code=200
         ) 
\ No newline at end of file
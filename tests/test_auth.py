@@ -0,0 +1,175 @@
+"""
+JWT 簽發與驗證測試
+"""
+import asyncio
+import hashlib
+import hmac
+import threading
+import time
+import unittest
+from unittest import mock
+
+import jwt
+
+from app import auth
+from app.auth import AuthService
+from app.config import settings
+
+
+def _payload(**overrides):
+    """建立有效的存取 Token payload"""
+    payload = {"sub": "1", "email": "a@example.com", "type": "access", "exp": int(time.time()) + 600}
+    payload.update(overrides)
+    return payload
+
+
+def _pyjwt(payload, key=None, **kwargs):
+    """以 PyJWT 簽發 Token"""
+    return jwt.encode(payload, key or settings.SECRET_KEY, algorithm=settings.ALGORITHM, **kwargs)
+
+
+class HmacSignTest(unittest.TestCase):
+    """HMAC 範本簽章"""
+
+    def test_matches_stdlib_hmac(self):
+        key = settings.SECRET_KEY.encode()
+        digest = {"HS256": hashlib.sha256, "HS384": hashlib.sha384, "HS512": hashlib.sha512}[settings.ALGORITHM]
+        for message in (b"", b"header.payload", b"x" * 10000):
+            self.assertEqual(auth._hmac_sign(message), hmac.new(key, message, digest).digest())
+
+    def test_template_is_reusable(self):
+        self.assertEqual(auth._hmac_sign(b"a.b"), auth._hmac_sign(b"a.b"))
+        self.assertNotEqual(auth._hmac_sign(b"a.b"), auth._hmac_sign(b"a.c"))
+
+
+class JwtCodecTest(unittest.TestCase):
+    """_encode_jwt / _decode_jwt 與 PyJWT 的相容性與拒絕條件"""
+
+    def test_round_trip(self):
+        payload = _payload()
+        self.assertEqual(auth._decode_jwt(auth._encode_jwt(payload)), payload)
+
+    def test_pyjwt_decodes_our_tokens(self):
+        payload = _payload()
+        decoded = jwt.decode(auth._encode_jwt(payload), settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        self.assertEqual(decoded, payload)
+
+    def test_we_decode_pyjwt_tokens(self):
+        payload = _payload()
+        self.assertEqual(auth._decode_jwt(_pyjwt(payload)), payload)
+
+    def test_header_other_than_precomputed_is_parsed(self):
+        token = _pyjwt(_payload(), headers={"kid": "k1"})
+        self.assertNotEqual(token.split(".")[0].encode(), auth._JWT_HEADER_B64)
+        self.assertEqual(auth._decode_jwt(token)["sub"], "1")
+
+    def test_rejects_signature_mismatch(self):
+        with self.assertRaises(jwt.InvalidSignatureError):
+            auth._decode_jwt(_pyjwt(_payload(), key="another-secret-key-of-sufficient-length"))
+
+    def test_rejects_tampered_payload(self):
+        header, _, signature = auth._encode_jwt(_payload()).split(".")
+        forged_payload = auth._b64url(b'{"sub":"2","type":"access","exp":9999999999}').decode()
+        with self.assertRaises(jwt.InvalidSignatureError):
+            auth._decode_jwt(f"{header}.{forged_payload}.{signature}")
+
+    def test_rejects_alg_none(self):
+        header = auth._b64url(b'{"alg":"none","typ":"JWT"}').decode()
+        body = auth._b64url(b'{"sub":"1","type":"access","exp":9999999999}').decode()
+        for token in (f"{header}.{body}.", f"{header}.{body}.c2lnbmF0dXJl"):
+            with self.assertRaises(jwt.InvalidTokenError):
+                auth._decode_jwt(token)
+
+    def test_rejects_other_algorithm_with_valid_signature(self):
+        header = auth._b64url(b'{"alg":"HS999","typ":"JWT"}')
+        signing_input = header + b"." + auth._b64url(b'{"sub":"1","type":"access","exp":9999999999}')
+        token = (signing_input + b"." + auth._b64url(auth._hmac_sign(signing_input))).decode()
+        with self.assertRaises(jwt.InvalidAlgorithmError):
+            auth._decode_jwt(token)
+
+    def test_rejects_missing_required_claims(self):
+        for claim in ("exp", "sub", "type"):
+            payload = _payload()
+            del payload[claim]
+            with self.subTest(claim=claim), self.assertRaises(jwt.MissingRequiredClaimError):
+                auth._decode_jwt(auth._encode_jwt(payload))
+
+    def test_rejects_expired(self):
+        with self.assertRaises(jwt.ExpiredSignatureError):
+            auth._decode_jwt(auth._encode_jwt(_payload(exp=int(time.time()) - 1)))
+
+    def test_rejects_wrong_segment_count(self):
+        header, payload, signature = auth._encode_jwt(_payload()).split(".")
+        for token in (f"{header}.{payload}", f"{header}.{payload}.{signature}.{signature}", "abc"):
+            with self.subTest(token=token), self.assertRaises(jwt.DecodeError):
+                auth._decode_jwt(token)
+
+
+class VerifyTokenTest(unittest.TestCase):
+    """AuthService 的 Token 驗證"""
+
+    def setUp(self):
+        auth._verified_cache.clear()
+        self.addCleanup(auth._verified_cache.clear)
+
+    def test_valid_access_token(self):
+        token_data = AuthService.verify_token(auth._encode_jwt(_payload()))
+        self.assertEqual((token_data.user_id, token_data.email), (1, "a@example.com"))
+
+    def test_rejects_wrong_type_and_non_numeric_sub(self):
+        for overrides in ({"type": "refresh"}, {"sub": "abc"}):
+            with self.subTest(**overrides):
+                self.assertIsNone(AuthService.verify_token(auth._encode_jwt(_payload(**overrides))))
+
+    def test_length_bounds(self):
+        # 以 pad claim 將 Token 加長到不超過上限的最大長度
+        pad = 0
+        while len(auth._encode_jwt(_payload(pad="x" * (pad + 1)))) <= auth._MAX_TOKEN_LENGTH:
+            pad += 1
+        longest = auth._encode_jwt(_payload(pad="x" * pad))
+        self.assertGreater(len(longest), auth._MAX_TOKEN_LENGTH - 4)
+        self.assertIsNotNone(AuthService.verify_token(longest))
+
+        with mock.patch.object(auth, "_decode_jwt", wraps=auth._decode_jwt) as decode:
+            self.assertIsNone(AuthService.verify_token("x" * (auth._MIN_TOKEN_LENGTH - 1)))
+            self.assertIsNone(AuthService.verify_token("x" * (auth._MAX_TOKEN_LENGTH + 1)))
+            with self.assertRaises(jwt.DecodeError):
+                AuthService.decode_token("x" * (auth._MAX_TOKEN_LENGTH + 1))
+            decode.assert_not_called()
+
+
+
+class RefreshCoalescingTest(unittest.IsolatedAsyncioTestCase):
+    """同一 refresh token 的並行重新整理"""
+
+    async def _refresh_concurrently(self, rotate):
+        """讓三個並行請求在輪替完成前都進入等待，回傳各自的結果或例外"""
+        release = threading.Event()
+
+        def slow_rotate(refresh_token, coalesce):
+            release.wait(5)
+            return rotate()
+
+        with mock.patch.object(AuthService, "refresh_access_token", side_effect=slow_rotate) as rotation:
+            tasks = [asyncio.ensure_future(AuthService.refresh_access_token_coalesced("r" * 43)) for _ in range(3)]
+            await asyncio.sleep(0.05)
+            release.set()
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+        rotation.assert_called_once()
+        return results
+
+    async def test_waiters_share_result(self):
+        results = await self._refresh_concurrently(lambda: {"access_token": "new"})
+        self.assertEqual(results, [{"access_token": "new"}] * 3)
+
+    async def test_waiters_receive_rotation_error(self):
+        def fail():
+            raise RuntimeError("database unavailable")
+
+        results = await self._refresh_concurrently(fail)
+        self.assertEqual([type(r) for r in results], [RuntimeError] * 3)
+        self.assertEqual(auth._refresh_inflight, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+"""
+資料庫連接池測試
+"""
+import unittest
+from unittest import mock
+
+from app import database
+from app.database import DatabaseManager, UserRepository
+
+
+class ConnectionPoolTest(unittest.TestCase):
+    """連接池重用與閒置連接淘汰"""
+
+    def setUp(self):
+        DatabaseManager.close_pool()
+        self.addCleanup(DatabaseManager.close_pool)
+        self.new_connection = mock.MagicMock(name="new_connection")
+        patcher = mock.patch.object(DatabaseManager, "_connect", return_value=self.new_connection)
+        self.connect = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _pool(self, connection, idle_seconds):
+        """將連接放入連接池，並設定其已閒置的秒數"""
+        database._connection_pool.put_nowait((connection, database.time.monotonic() - idle_seconds))
+
+    def test_reuses_recent_connection(self):
+        pooled = mock.MagicMock(name="pooled")
+        self._pool(pooled, idle_seconds=1)
+
+        with DatabaseManager.get_connection() as conn:
+            self.assertIs(conn, pooled)
+
+        self.connect.assert_not_called()
+        pooled.close.assert_not_called()
+
+    def test_closes_stale_connection_instead_of_reusing(self):
+        stale = mock.MagicMock(name="stale")
+        self._pool(stale, idle_seconds=database.settings.DB_POOL_MAX_IDLE_SECONDS + 1)
+
+        with DatabaseManager.get_connection() as conn:
+            self.assertIs(conn, self.new_connection)
+
+        stale.close.assert_called_once_with()
+        stale.cursor.assert_not_called()
+        self.connect.assert_called_once_with()
+
+    def test_returned_connection_goes_back_to_pool(self):
+        with DatabaseManager.get_connection():
+            pass
+
+        connection, _ = database._connection_pool.get_nowait()
+        self.assertIs(connection, self.new_connection)
+        self.new_connection.commit.assert_called_once_with()
+
+
+
+class UserCacheTest(unittest.TestCase):
+    """使用者資料快取回傳複本"""
+
+    def setUp(self):
+        self.addCleanup(database._user_cache.clear)
+        row = {"id": 1, "email": "a@example.com", "password_hash": "hash", "is_active": True}
+        patcher = mock.patch.object(DatabaseManager, "execute_query", return_value=[row])
+        self.execute_query = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_mutating_result_does_not_change_cache(self):
+        UserRepository.get_user_by_id(1).pop("password_hash")
+        UserRepository.get_cached_user_by_id(1).pop("password_hash")
+
+        self.assertEqual(UserRepository.get_user_by_id(1)["password_hash"], "hash")
+        self.assertEqual(UserRepository.get_cached_user_by_id(1)["password_hash"], "hash")
+        self.execute_query.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+"""
+測試登入頁面與健康檢查的快取標頭測試
+"""
+import unittest
+from unittest import mock
+
+from fastapi.testclient import TestClient
+
+from app import main
+from app.database import DatabaseManager
+
+
+class AcceptedEncodingsTest(unittest.TestCase):
+    """Accept-Encoding 解析"""
+
+    def test_lists_codings(self):
+        self.assertEqual(main._accepted_encodings("gzip, deflate, br"), {"gzip", "deflate", "br"})
+        self.assertEqual(main._accepted_encodings("GZIP;q=0.5"), {"gzip"})
+        self.assertEqual(main._accepted_encodings(""), frozenset())
+
+    def test_q_zero_refuses_coding(self):
+        self.assertEqual(main._accepted_encodings("br;q=0, gzip"), {"gzip"})
+        self.assertEqual(main._accepted_encodings("gzip;q=0"), frozenset())
+        self.assertEqual(main._accepted_encodings("gzip; q=0.000"), frozenset())
+        self.assertEqual(main._accepted_encodings("gzip;q=abc"), frozenset())
+
+    def test_wildcard(self):
+        self.assertEqual(main._accepted_encodings("*"), {"br", "gzip"})
+        self.assertEqual(main._accepted_encodings("*, br;q=0"), {"gzip"})
+        self.assertEqual(main._accepted_encodings("*;q=0"), frozenset())
+
+
+class EtagMatchesTest(unittest.TestCase):
+    """If-None-Match 比對"""
+
+    def test_matches(self):
+        self.assertTrue(main._etag_matches('"abc"', '"abc"'))
+        self.assertTrue(main._etag_matches('"x", "abc"', '"abc"'))
+        self.assertTrue(main._etag_matches('"x",W/"abc"', '"abc"'))
+        self.assertTrue(main._etag_matches('"abc"', 'W/"abc"'))
+        self.assertTrue(main._etag_matches("*", '"abc"'))
+
+    def test_does_not_match(self):
+        self.assertFalse(main._etag_matches(None, '"abc"'))
+        self.assertFalse(main._etag_matches("", '"abc"'))
+        self.assertFalse(main._etag_matches('"ab"', '"abc"'))
+        self.assertFalse(main._etag_matches('"abcd"', '"abc"'))
+        self.assertFalse(main._etag_matches('"x""abc"', '"abc"'))
+
+
+class TestLoginPageTest(unittest.TestCase):
+    """測試登入頁面的內容編碼、ETag 與 304"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.client = TestClient(main.app)
+
+    def _get(self, accept_encoding, if_none_match=None):
+        headers = {"accept-encoding": accept_encoding}
+        if if_none_match is not None:
+            headers["if-none-match"] = if_none_match
+        return self.client.get("/test-login", headers=headers)
+
+    def _assert_variant(self, accept_encoding, content_encoding, etag):
+        response = self._get(accept_encoding)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers.get("content-encoding"), content_encoding)
+        self.assertEqual(response.headers["etag"], etag)
+        self.assertEqual(response.headers["vary"], "Accept-Encoding")
+        self.assertEqual(response.content, main._TEST_LOGIN_HTML)
+
+        not_modified = self._get(accept_encoding, if_none_match=f'"other", {etag}')
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.headers["etag"], etag)
+        self.assertEqual(not_modified.headers["vary"], "Accept-Encoding")
+        self.assertNotIn("content-encoding", not_modified.headers)
+        self.assertEqual(not_modified.content, b"")
+
+    @unittest.skipIf(main._TEST_LOGIN_HTML_BR is None, "brotli 未安裝")
+    def test_brotli(self):
+        self._assert_variant("gzip, br", "br", main._TEST_LOGIN_ETAG_BR)
+        self._assert_variant("*", "br", main._TEST_LOGIN_ETAG_BR)
+
+    def test_gzip(self):
+        self._assert_variant("gzip", "gzip", main._TEST_LOGIN_ETAG_GZ)
+        self._assert_variant("br;q=0, gzip", "gzip", main._TEST_LOGIN_ETAG_GZ)
+        self._assert_variant("*, br;q=0", "gzip", main._TEST_LOGIN_ETAG_GZ)
+
+    def test_identity(self):
+        self._assert_variant("identity", None, main._TEST_LOGIN_ETAG)
+        self._assert_variant("gzip;q=0", None, main._TEST_LOGIN_ETAG)
+        self._assert_variant("br;q=0, gzip;q=0", None, main._TEST_LOGIN_ETAG)
+
+    def test_etag_of_other_encoding_does_not_match(self):
+        response = self._get("gzip;q=0", if_none_match=main._TEST_LOGIN_ETAG_GZ)
+        self.assertEqual(response.status_code, 200)
+
+    def test_partial_etag_does_not_match(self):
+        response = self._get("gzip", if_none_match=main._TEST_LOGIN_ETAG_GZ[:-3] + '"')
+        self.assertEqual(response.status_code, 200)
+
+
+class HealthCheckTest(unittest.TestCase):
+    """健康檢查的弱 ETag"""
+
+    def setUp(self):
+        patcher = mock.patch.object(DatabaseManager, "execute_scalar", return_value=1)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = TestClient(main.app)
+
+    def test_weak_etag_list_returns_304(self):
+        response = self.client.get("/health", headers={"if-none-match": f'"other", {main._HEALTH_ETAG}'})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["etag"], main._HEALTH_ETAG)
+
+    def test_other_etag_returns_body(self):
+        response = self.client.get("/health", headers={"if-none-match": 'W/"healthy-v0"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["etag"], main._HEALTH_ETAG)
+
+
+if __name__ == "__main__":
+    unittest.main()